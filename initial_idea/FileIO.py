@@ -4,6 +4,39 @@ import numpy as np
 import Util
 
 
+# Number of characters read at once, when parsing an ASCII file.
+NCHAR_CHUNK = int(2**26)
+
+
+# Function that returns all the numbers of an ASCII file, one chunk at a time. Each chunk is
+# tokenized in bulk and is independent of the line layout, since all whitespace is a separator.
+def TokenizeASCII(grid, nChunk=NCHAR_CHUNK):
+
+    # Remainder of the previous chunk, which may contain a number that is cut in half.
+    rest = ""
+
+    # Read the file in chunks.
+    while True:
+        buffer = grid.read(nChunk)
+        if len(buffer) == 0:
+            break
+        buffer = rest + buffer
+
+        # Only parse up to the last whitespace, the remainder is kept for the next chunk.
+        i = max( buffer.rfind(c) for c in " \t\r\n" )
+        if i < 0:
+            rest = buffer
+            continue
+        rest = buffer[i:]
+
+        # Tokenize this chunk, unless it is only whitespace.
+        if len(buffer[:i].strip()) > 0:
+            yield np.fromstring( buffer[:i], sep=" " )
+
+    # Tokenize whatever is left.
+    if len(rest.strip()) > 0:
+        yield np.fromstring( rest, sep=" " )
+
 
 # Function that reads a Plot3D grid file.
 def ImportGridPlot3D(file):
@@ -11,124 +44,67 @@ def ImportGridPlot3D(file):
     # Open file to start extracting the data.
     with open(file, 'r') as grid:
 
-        # First integer is the number of blocks.
-        nBlock = grid.readline().split() 
-
-        # Ensure number of blocks is a single value.
-        if( len(nBlock) != 1 ):
-            sys.exit( "Wront nBlock detected." )
-        
-        # Convert it to an integer type.
-        nBlock = int( nBlock[0] )
-
-        # Create a numpy of type int for the number of points per block.
-        nPoint = np.zeros( (nBlock, 3), dtype = int )
-
-        # Read the next nBlocks with their number of points in x,y,z.
-        for i in range(nBlock):
-
-            # Extract line, with end character.
-            info = grid.readline()
-
-            # Check if end of file is reached.
-            if len(info) == 0:
-                sys.exit( "Error, end of file reached unexpectedly." )
-
-            # Extract information, by skipping white spaces and end line characters.
-            info = info.split()
-
-            # Check number of arguments is three.
-            if( len(info) != 3):
-                sys.exit( "Number of points per block must be 3." );
-
-            # Extract number of points per block.
-            nPoint[i][0] = int( info[0] )
-            nPoint[i][1] = int( info[1] )
-            nPoint[i][2] = int( info[2] )
-
-
-        # Deduce size of 1D array of all information per dimension.
-        IDX = Util.Indices1DArrayFrom3D(nPoint)
-
-        # Allocate memory for the coordinates in all the blocks.
-        x = np.zeros( IDX[-1], dtype=float )
-        y = np.zeros( IDX[-1], dtype=float )
-        z = np.zeros( IDX[-1], dtype=float )
- 
-        tmp = []
-        for b in range(nBlock):
-
-            # Explicitly write the number of points.
-            nx = nPoint[b][0]
-            ny = nPoint[b][1]
-            nz = nPoint[b][2]
-
-            # Total number of points.
-            n = nx*ny*nz 
-            
-            # Allocate memory for the coordinates in this block.
-            xyz = np.zeros( (3, n) )
-
-
-            # Starting index for the x-coordinates.
-            s = IDX[b]
-
-
-            # Read in the coordinates, from x to z.
-            for k in range(nz):
-                for j in range(ny):
-                   
-                    # Read line.
-                    buffer = grid.readline().split()
-                    
-                    if( len(buffer) != nx ):
-                        sys.exit( "Wrong number of points in the i-direction detected." )
-                        
-                    for i in range(nx):
-                        x[s] = float( buffer[i] )
-                        s += 1
-
-            # Check index is correct for the y-coordinates. Then, reset it.
-            if( s != n+IDX[b] ):
-                sys.exit( "Starting index for the y-coordinates is wrong" )
-            else:
-                s = IDX[b]
-
-            # Read in the coordinates, from x to z.
-            for k in range(nz):
-                for j in range(ny):
-                    
-                    # Read line.
-                    buffer = grid.readline().split()
-                    
-                    if( len(buffer) != nx ):
-                        sys.exit( "Wrong number of points in the j-direction detected." )
-                        
-                    for i in range(nx):
-                        y[s] = float( buffer[i] )
-                        s += 1
-            
-            # Check index is correct for the z-coordinates. Then, reset it.
-            if( s != n+IDX[b] ):
-                sys.exit( "Starting index for the z-coordinates is wrong" )
-            else:
-                s = IDX[b]
-
-            # Read in the coordinates, from x to z.
-            for k in range(nz):
-                for j in range(ny):
-                    
-                    # Read line.
-                    buffer = grid.readline().split()
-                    
-                    if( len(buffer) != nx ):
-                        sys.exit( "Wrong number of points in the k-direction detected." )
-                        
-                    for i in range(nx):
-                        z[s] = float( buffer[i] )
-                        s += 1
-            
-        # Return values with array size indices.
-        return x, y, z, IDX, nPoint
-
-
+        # Header and data values, respectively.
+        head = np.zeros( 0, dtype=float )
+        data = None; s = 0
+
+        # Stream over all the numbers in the file.
+        for tokens in TokenizeASCII(grid):
+
+            # Fill the data, once the header is known.
+            if data is not None:
+                if s + len(tokens) > len(data):
+                    sys.exit( "Error, more values than expected in the file." )
+                data[s:s+len(tokens)] = tokens
+                s += len(tokens)
+                continue
+
+            # Extract the header, i.e. the number of blocks and their number of points in x,y,z.
+            head = np.concatenate( (head, tokens) )
+            if len(head) == 0:
+                continue
+
+            # First integer is the number of blocks.
+            nBlock = int( head[0] )
+            if nBlock < 1 or nBlock != head[0]:
+                sys.exit( "Wront nBlock detected." )
+
+            # Wait until the entire header is read.
+            if len(head) < 1 + 3*nBlock:
+                continue
+
+            # Create a numpy of type int for the number of points per block.
+            nPoint = head[1:1+3*nBlock].reshape(nBlock, 3).astype(int)
+            if np.any( nPoint < 1 ):
+                sys.exit( "Number of points per block must be positive." )
+
+            # Allocate memory for the data of all the blocks, ordered as x,y,z per block.
+            data = np.zeros( 3*int( nPoint.prod(axis=1).sum() ), dtype=float )
+
+            # Remaining values belong to the data.
+            tokens = head[1+3*nBlock:]
+            if len(tokens) > len(data):
+                sys.exit( "Error, more values than expected in the file." )
+            data[:len(tokens)] = tokens
+            s = len(tokens)
+
+        # Ensure all the data is read.
+        if data is None or s != len(data):
+            sys.exit( "Error, end of file reached unexpectedly." )
+
+    # Deduce size of 1D array of all information per dimension.
+    IDX = Util.Indices1DArrayFrom3D(nPoint)
+
+    # Split the data into the coordinates of all the blocks.
+    x = np.zeros( IDX[-1], dtype=float )
+    y = np.zeros( IDX[-1], dtype=float )
+    z = np.zeros( IDX[-1], dtype=float )
+    for b in range(nBlock):
+        n   = IDX[b+1] - IDX[b]
+        xyz = data[3*IDX[b]:3*IDX[b+1]].reshape(3, n)
+        x[IDX[b]:IDX[b+1]] = xyz[0]
+        y[IDX[b]:IDX[b+1]] = xyz[1]
+        z[IDX[b]:IDX[b+1]] = xyz[2]
+
+    # Return values with array size indices.
+    return x, y, z, IDX, nPoint
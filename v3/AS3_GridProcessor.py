@@ -1,19 +1,197 @@
 # Imported libraries/functions.
 import os
 import sys
+import time
 import numpy as np
 import FileInput as fi
 import FileOutput as fo
-import Visualization as vis
+import GeometryUtility as geo
 import ElementUtility as dgfem
+from concurrent.futures import ProcessPoolExecutor
+
+
+# Function that converts a single grid zone without any user interaction, based on its existing 
+# marker file or marker specification file. Note, this does not import matplotlib.
+def ConvertZoneHeadless(file, nPoly, precision=8):
+
+    # Find the marker file of this zone.
+    fm = fi.DetermineMarkerFile(file)
+    if not fm:
+        sys.exit("No marker file found for grid file: " + str(file))
+
+    # Import the zone, memory-mapped if binary, since it is only read once.
+    data = fi.ImportSingleZonePlot3D( file, mmap=True )
+
+    # Extract the number of points per dimension.
+    nx = data[3][0]; ny = data[3][1]
+
+    # Import the markers. If these are specified by their start/end indices, write them out as well.
+    if fm.endswith(".spec"):
+        marker_p3d = fi.ImportMarkerSpec( fm, nx, ny )
+        fo.ExportMarkerASCII( marker_p3d, nPoly, file )
+        fo.ExportMarkerBinary( marker_p3d, nPoly, file )
+    else:
+        marker_p3d = fi.ImportMarker( fm, nPoly )
+
+    # Ensure the entire boundary is included in the markers, i.e. no missing points.
+    if geo.MarkersContainEntireBoundary(marker_p3d, nx, ny) != True:
+        sys.exit("Some boundary points are not included in the markers of: " + str(file))
+
+    # Convert input grid from Plot3D to AS3 format, inclusive of markers. The coordinates are streamed.
+    grid_as3 = dgfem.ConvertGridFromPlot3DToAS3( data, marker_p3d, nPoly, file, stream=True )
+
+    # Write the AS3 grid file in binary format, including its markers.
+    fo.WriteAS3GridBinaryFormat( grid_as3, file, precision )
+
+
+# Function that verifies the AS3 grid file of a single grid zone against the zone and its marker file, 
+# without any user interaction. Both grid files are memory-mapped and compared in chunks.
+def VerifyZoneHeadless(file, nPoly):
+
+    # Find the marker file and AS3 grid file of this zone.
+    fm = fi.DetermineMarkerFile(file)
+    if not fm:
+        sys.exit("No marker file found for grid file: " + str(file))
+    fa = fi.DetermineAS3File(file)
+    if not os.path.isfile(fa):
+        sys.exit("No AS3 grid file found for grid file: " + str(file))
+
+    # Import the zone and its AS3 grid, memory-mapped since they are only read once.
+    data     = fi.ImportSingleZonePlot3D( file, mmap=True )
+    grid_as3 = fi.ImportAS3GridBinaryFormat( fa, mmap=True )
+
+    # Import the markers, based on the type of marker file.
+    if fm.endswith(".spec"):
+        marker_p3d = fi.ImportMarkerSpec( fm, data[3][0], data[3][1] )
+    else:
+        marker_p3d = fi.ImportMarker( fm, nPoly )
+
+    # Compare the AS3 grid against the zone and issue an error with all mismatches found, if any.
+    mismatch = dgfem.VerifyGridPlot3DToAS3( data, marker_p3d, grid_as3, nPoly )
+    if len(mismatch) > 0:
+        sys.exit( " ".join(mismatch) )
+
+
+# Function that applies an action, e.g. a headless conversion or verification, to a single grid zone and 
+# reports on it, instead of exiting on failure. The label is the message reported on success.
+# Returns the grid file, whether it succeeded, a message and the wall time in seconds.
+def ZoneReport(action, label, file, *args):
+
+    # Start the timer.
+    t0 = time.perf_counter()
+
+    # Apply the action to the zone, while catching any error issued or raised, such that other zones are not affected.
+    try:
+        action( file, *args )
+        status = True; message = label
+    except SystemExit as e:
+        status = False; message = str(e)
+    except Exception as e:
+        status = False; message = repr(e)
+
+    # Return the report of this zone.
+    return [file, status, message, time.perf_counter() - t0]
+
+
+# Function that applies an action to all the zones in the grid directory of the input file in parallel, using 
+# nWorker processes, and reports on each of them. Every block of a multi-block file is a separate zone. The largest 
+# zones, in terms of their number of points, are submitted first, for a better load balance. Returns the report per zone.
+def ReportAllZonesParallel(action, label, file, nWorker, *args):
+
+    # Obtain all grid zones in the directory of the input file, regardless of its selected block.
+    zones = fi.ExpandGridZones( fi.DetermineGridFiles( fi.SplitZone(file)[0] )[0] )
+
+    # Order the zones by their number of points, largest first.
+    zones = sorted( zones, key=fi.NumberOfPointsZone, reverse=True )
+
+    # Fan out the zones over the worker processes and collect their reports, in submission order.
+    with ProcessPoolExecutor( max_workers=nWorker ) as pool:
+        jobs   = [ pool.submit( ZoneReport, action, label, zone, *args ) for zone in zones ]
+        report = [ job.result() for job in jobs ]
+
+    # Return the report of all the zones.
+    return report
+
+
+# Function that converts all the zones in the grid directory of the input file in parallel, using nWorker 
+# processes. Returns the report per zone.
+def ConvertAllZonesParallel(file, nPoly, nWorker, precision=8):
+    return ReportAllZonesParallel( ConvertZoneHeadless, "converted", file, nWorker, nPoly, precision )
+
+
+# Function that verifies all the zones in the grid directory of the input file in parallel, using nWorker 
+# processes. Returns the report per zone.
+def VerifyAllZonesParallel(file, nPoly, nWorker):
+    return ReportAllZonesParallel( VerifyZoneHeadless, "verified", file, nWorker, nPoly )
 
 
 # Main function.
 def main():
 
+    # Precision of the AS3 coordinates, which is double by default, unless single precision is requested.
+    precision = 8
+    if "--single" in sys.argv[1:]:
+        sys.argv.remove("--single"); precision = 4
+
+    # Parallel headless mode, which converts or verifies every zone in the grid directory of the input file.
+    if len( sys.argv ) > 1 and ( sys.argv[1] == "--parallel" or sys.argv[1] == "--verify" ):
+
+        # Check if the program is called correctly.
+        if len( sys.argv ) != 5:
+            sys.exit( "Usage: " + sys.argv[1] + " <number of workers> <polynomial order> <grid file>" )
+
+        # Get the number of worker processes, where zero means all available cores.
+        nWorker = int( sys.argv[2] )
+        if nWorker < 1: nWorker = os.cpu_count()
+
+        # Convert or verify all the zones.
+        if sys.argv[1] == "--verify":
+            report = VerifyAllZonesParallel( sys.argv[4], int( sys.argv[3] ), nWorker )
+            action = "verified"
+        else:
+            report = ConvertAllZonesParallel( sys.argv[4], int( sys.argv[3] ), nWorker, precision )
+            action = "converted"
+
+        # Show the report per zone.
+        for file, status, message, wall in report:
+            print( "{0:<8} {1:9.3f}s  {2}: {3}".format( "OK" if status else "FAILED", wall, file, message ) )
+
+        # Issue an error, if any of the zones failed.
+        nFail = sum( not r[1] for r in report )
+        if nFail > 0:
+            sys.exit( str(nFail) + " out of " + str(len(report)) + " zones could not be " + action + "." )
+
+        # Nothing else to do.
+        return
+
+    # Headless batch mode, which converts every input zone based on its marker files.
+    if len( sys.argv ) > 1 and sys.argv[1] == "--batch":
+
+        # Check if the program is called correctly.
+        if len( sys.argv ) < 4:
+            sys.exit( "Usage: --batch <polynomial order> <grid file> [<grid file> ...]" )
+
+        # Get the polynomial order of the grids.
+        nPoly = int( sys.argv[2] )
+
+        # Convert all the input zones, one at a time. Multi-block files are converted block by block.
+        for file in fi.ExpandGridZones( sys.argv[3:] ):
+            ConvertZoneHeadless( file, nPoly, precision )
+
+        # Nothing else to do.
+        return
+
     # Check if the program is called correctly. 
     if len( sys.argv ) != 4:
-        sys.exit( "Usage: <grid file> <polynomial order> <number of boundary markers>" ) 
+        sys.exit( "Usage: <grid file> <polynomial order> <number of boundary markers>\n"
+                  "   or: --batch <polynomial order> <grid file> [<grid file> ...]\n"
+                  "   or: --parallel <number of workers> <polynomial order> <grid file>\n"
+                  "   or: --verify <number of workers> <polynomial order> <grid file>\n"
+                  "A block of a multi-block grid file is selected as <grid file>:<block>.\n"
+                  "Add --single to write the AS3 coordinates in single precision." ) 
+
+    # Only import the visualization, hence matplotlib, when interaction is required.
+    import Visualization as vis
 
     # Get input grid file.
     file = sys.argv[1]
@@ -27,26 +205,24 @@ def main():
     # Obtain all grid files and index of input file.
     zoneFiles = fi.DetermineGridFiles(file)
 
-    # Determine number of grid zones detected.
-    nZone = len(zoneFiles[0])
-
-    # Import all the zones, one at a time.
-    data = []
-    for i in range(nZone):
-        data.append( fi.ImportSingleZoneBinaryPlot3D(zoneFiles[0][i]) )
+    # Import all the zones, of which only the input zone is decoded entirely.
+    data, iZone = fi.ImportGridZones( zoneFiles[0], zoneFiles[1] )
 
 
     # Visualize the data and apply the boundary markers.
-    marker_p3d = vis.InteractiveMarker( data, nMarker, file, nPoly, zoneFiles[1] )
+    marker_p3d = vis.InteractiveMarker( data, nMarker, file, nPoly, iZone )
 
     # Write the marker data to an ASCII file.
     fo.ExportMarkerASCII( marker_p3d, nPoly, file )
 
-    # Convert input grid from Plot3D to AS3 format, inclusive of markers.
-    grid_as3 = dgfem.ConvertGridFromPlot3DToAS3( data[zoneFiles[1]], marker_p3d, nPoly, file )
+    # Write the marker data to a binary file as well, which is faster to reload.
+    fo.ExportMarkerBinary( marker_p3d, nPoly, file )
+
+    # Convert input grid from Plot3D to AS3 format, inclusive of markers. The coordinates are streamed.
+    grid_as3 = dgfem.ConvertGridFromPlot3DToAS3( data[iZone], marker_p3d, nPoly, file, stream=True )
 
     # Write the AS3 grid file in binary format, including its markers.
-    fo.WriteAS3GridBinaryFormat( grid_as3, file )
+    fo.WriteAS3GridBinaryFormat( grid_as3, file, precision )
 
 
 # Main function that drives the program.
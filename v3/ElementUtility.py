@@ -3,6 +3,7 @@ import os
 import sys
 import math
 import numpy as np
+import GeometryUtility as geo
 
 
 # Global variables for IMIN, IMAX, JMIN, JMAX nodal indices in an element.
@@ -11,6 +12,9 @@ IMAX = int(1)
 JMIN = int(2)
 JMAX = int(3)
 
+# Maximum number of elements that are verified at once.
+NELEM_CHUNK = int(65536)
+
 
 # Function that returns number of elements in 1D from number of points, given a polynomial order.
 def DetermineNumberOfElements(nPoints, nPoly):
@@ -30,8 +34,61 @@ def DetermineNumberOfElements(nPoints, nPoly):
 
 
 
+# Function that returns the Plot3D indices of the nodes of the elements iElem, based on AS3 format.
+def ElementConnectivity(iElem, nx, ny, nPoly):
+
+    # Number of nodes per element in 1D.
+    nNode1D = int(nPoly+1)
+
+    # Deduce number of elements in the i-direction.
+    nxElem = DetermineNumberOfElements(nx, nPoly) 
+
+    # For the connectivity matrix, function of nPoly. Row-major over (j,i): C = i - j*nx.
+    r = np.arange(nNode1D, dtype=int)
+    C = ( r[np.newaxis,:] - nx*r[:,np.newaxis] ).ravel()
+
+    # Element indices in both directions, with i running fastest.
+    iElem = np.asarray(iElem, dtype=int)
+    i = iElem % nxElem; j = iElem // nxElem
+
+    # Starting point of every element. In the j-direction, this starts from the top,
+    # whereas in the i-direction it is offset by nPoly.
+    I0 = (ny - nPoly*j)*nx - nx + nPoly*i
+
+    # Return the indices of the elements.
+    return I0[...,np.newaxis] + C
+
+
+# Class that holds the coordinates of the elements in AS3 format, without materializing them. 
+# They are gathered one row of elements at a time, whenever they are iterated over by Rows.
+class CoordinatesAS3:
+
+    # Constructor, based on the Plot3D coordinates of the grid.
+    def __init__(self, v_p3d, nx, ny, nPoly):
+
+        # Plot3D coordinates and number of points per dimension.
+        self.v_p3d = v_p3d
+        self.nx = nx; self.ny = ny; self.nPoly = nPoly
+
+        # Deduce number of elements.
+        self.nxElem = DetermineNumberOfElements(nx, nPoly) 
+        self.nyElem = DetermineNumberOfElements(ny, nPoly) 
+
+        # Size of the equivalent (nElem, nNode2D) array.
+        self.shape = (self.nxElem*self.nyElem, int(nPoly+1)**2)
+
+    # Function that returns the coordinates of every row of elements, in native double precision.
+    def Rows(self):
+        for j in range(self.nyElem):
+            iElem = np.arange(j*self.nxElem, (j+1)*self.nxElem, dtype=int)
+            D     = ElementConnectivity(iElem, self.nx, self.ny, self.nPoly)
+            yield np.asarray( self.v_p3d[D], dtype=float )
+
+
 # Function that converts the grid format from Plot3D to AS3.
-def ConvertGridFromPlot3DToAS3(data, marker_p3d, nPoly, file):
+# If stream is true, the coordinates are returned as CoordinatesAS3, which are only
+# gathered one row of elements at a time, when they are written.
+def ConvertGridFromPlot3DToAS3(data, marker_p3d, nPoly, file, stream=False):
 
     # Extract the data variables, explicitly.
     x_p3d = data[0]
@@ -41,54 +98,24 @@ def ConvertGridFromPlot3DToAS3(data, marker_p3d, nPoly, file):
     # Extract the number of points per dimension.
     nx = n_p3d[0]; ny = n_p3d[1]
 
-    # Number of nodes per element in 1D and 2D.
-    nNode1D = int(nPoly+1)
-    nNode2D = nNode1D*nNode1D
-
     # Deduce number of elements.
     nxElem = DetermineNumberOfElements(nx, nPoly) 
     nyElem = DetermineNumberOfElements(ny, nPoly) 
 
     # Total number of elements.
     nElem  = nxElem*nyElem
-    
-    # Initialize the connectivity matrix.
-    C = np.zeros( nNode2D, dtype=int )
-    
-    # For the connectivity matrix, function of nPoly.
-    k = 0
-    for j in range(nNode1D):
-        for i in range(nNode1D):
-            C[k] = i - j*nx 
-            k += 1
-
-    # Initialize indices of elements, based on AS3 format.
-    D_p3d_to_as3 = np.zeros( (nElem, nNode2D), dtype=int )
-
-    # Initialize coordinates of elements in AS3 format.
-    x_as3 = np.zeros( (nElem, nNode2D), dtype=float )
-    y_as3 = np.zeros( (nElem, nNode2D), dtype=float )
-    
-    s = 0
-    for j in range(nyElem):
-        # Deduce the next starting point in the j-directoin.
-        I0 = int( (ny - j*nPoly)*nx - nx )
-        for i in range(nxElem):
-            for k in range(nNode2D):
-                
-                # Element indices.
-                D_p3d_to_as3[s, k] = I0 + C[k]
-                # Coordinates.
-                x_as3[s, k] = x_p3d[ D_p3d_to_as3[s,k] ]
-                y_as3[s, k] = y_p3d[ D_p3d_to_as3[s,k] ]
-
-            # Increment element index.
-            s += 1
-            # Deduce the next starting point in the i-direction.
-            I0 += nPoly
+
+    # Coordinates of elements in AS3 format.
+    if stream:
+        x_as3 = CoordinatesAS3( x_p3d, nx, ny, nPoly )
+        y_as3 = CoordinatesAS3( y_p3d, nx, ny, nPoly )
+    else:
+        # Gathered one row of elements at a time, such that the connectivity is never formed entirely.
+        x_as3 = np.concatenate( list( CoordinatesAS3( x_p3d, nx, ny, nPoly ).Rows() ) )
+        y_as3 = np.concatenate( list( CoordinatesAS3( y_p3d, nx, ny, nPoly ).Rows() ) )
     
     # Determine the equivalent AS3 format for the Plot3D markers.
-    marker_as3 = ConvertMarkerFromPlot3DToAS3(marker_p3d, D_p3d_to_as3, nxElem, nyElem, nPoly)
+    marker_as3 = ConvertMarkerFromPlot3DToAS3(marker_p3d, nx, ny, nPoly)
 
     # Return the grid data in AS3 format.
     return x_as3, y_as3, marker_as3, nxElem, nyElem
@@ -96,7 +123,7 @@ def ConvertGridFromPlot3DToAS3(data, marker_p3d, nPoly, file):
 
 
 # Function that converts the Plot3D marker into an AS3 marker, based on elements.
-def ConvertMarkerFromPlot3DToAS3(marker_p3d, elements, nxElem, nyElem, nPoly):
+def ConvertMarkerFromPlot3DToAS3(marker_p3d, nx, ny, nPoly):
 
     # Number of markers.
     nMarker = len(marker_p3d)
@@ -114,7 +141,7 @@ def ConvertMarkerFromPlot3DToAS3(marker_p3d, elements, nxElem, nyElem, nPoly):
         name  = marker_p3d[i][0]
 
         # Abbreviation for current marker indices.
-        m_ps3 = marker_p3d[i][1]
+        m_ps3 = np.asarray( marker_p3d[i][1], dtype=int ).ravel()
 
         # Determine number of points on this marker.
         npts = len(m_ps3)
@@ -122,52 +149,11 @@ def ConvertMarkerFromPlot3DToAS3(marker_p3d, elements, nxElem, nyElem, nPoly):
         # Deduce the equivalent number of faces on this marker.
         nFace = DetermineNumberOfElements(npts, nPoly) 
 
-        # Allocate the AS3 face marker information.
-        face_as3 = np.zeros( (nFace, 2), dtype=int )
-
-        # Loop over every face and correlate its element.
-        for j in range(nFace):
-
-            # Starting index of current face marker.
-            I0 = j*nPoly
-
-            # Explicitly form the element face marker indices.
-            v  = np.array( m_ps3[I0:I0+nNode] )
-
-            # Check if this tag belongs to face: IMIN.
-            imin = CheckMarkerElementIMIN( elements, nxElem, nyElem, nPoly, v ) 
-            if imin:
-                # Assign face marker value.
-                face_as3[j] = imin
-                # Skip remaining iterations in this loop.
-                continue 
-            
-            # Check if this belongs to face: IMAX.
-            imax = CheckMarkerElementIMAX( elements, nxElem, nyElem, nPoly, v ) 
-            if imax:
-                # Assign face marker value.
-                face_as3[j] = imax
-                # Skip remaining iterations in this loop.
-                continue 
-
-            # Check if this belongs to face: JMIN.
-            jmin = CheckMarkerElementJMIN( elements, nxElem, nyElem, nPoly, v ) 
-            if jmin:
-                # Assign face marker value.
-                face_as3[j] = jmin
-                # Skip remaining iterations in this loop.
-                continue 
-
-            # Check if this belonds to face: JMAX.
-            jmax = CheckMarkerElementJMAX( elements, nxElem, nyElem, nPoly, v ) 
-            if jmax:
-                # Assign face marker value.
-                face_as3[j] = jmax
-                # Skip remaining iterations in this loop.
-                continue 
-
-            # If the code reaches this far, it means something is wrong: issue and error.
-            sys.exit("Marker could not be converted from Plot3D to AS3.")
+        # Explicitly form the element face marker indices, one row per face.
+        v = m_ps3[ nPoly*np.arange(nFace, dtype=int)[:,np.newaxis] + np.arange(nNode, dtype=int) ]
+
+        # Correlate all the faces of this marker with their elements at once.
+        face_as3 = FindElementMarker(v, nx, ny, nPoly)
 
         # Append the AS3 marker information for this face.
         marker_as3.append( [name, face_as3] )
@@ -176,142 +162,108 @@ def ConvertMarkerFromPlot3DToAS3(marker_p3d, elements, nxElem, nyElem, nPoly):
     return marker_as3 
 
 
-# Function that processes whether a marker belongs to a boundary: JMIN. 
-def CheckMarkerElementJMIN(elements, nxElem, nyElem, nPoly, m):
-
-    # Face tag.
-    tag = JMIN
-
-    # Start and stop element indices. NOTE, start is inclusive, end is exclusive.
-    I0 = int(0)
-    I1 = int(nxElem)
-
-    # Form the element indices.
-    elem_idx = np.arange(I0, I1, dtype=int)
+# Function that returns the info (iElem,iBoundary) of the elements belonging to the faces of a marker,
+# given one row of nodal indices per face. On a structured grid, these follow directly from the position 
+# of the first (clockwise) node of every face on the boundary, see SurfaceIndicesClockwise.
+def FindElementMarker(m, nx, ny, nPoly):
 
-    # Start and stop nodal indices. NOTE, start is inclusive, end is exclusive.
-    I0 = int(nPoly)
-    I1 = int(-1)
-
-    # Form the clockwise local nodal indices.
-    node_idx = np.arange(I0, I1, -1, dtype=int )
-
-    # Number of nodes in 1D.
+    # Number of nodes in 1D over an element.
     nNode = int(nPoly+1)
 
-    # Search for the indices, if they can be found.
-    info = FindElementMarker(elements, elem_idx, node_idx, m, tag)
-
-    # Return the information if found, otherwise its an empty list. 
-    return info
-               
-
-# Function that processes whether a marker belongs to a boundary: JMAX. 
-def CheckMarkerElementJMAX(elements, nxElem, nyElem, nPoly, m):
-
-    # Face tag.
-    tag = JMAX
-
-    # Start and stop element indices. NOTE, start is inclusive, end is exclusive.
-    I0 = int(nxElem*nyElem-nxElem )
-    I1 = int(nxElem*nyElem)
-
-    # Form the element indices.
-    elem_idx = np.arange(I0, I1, dtype=int)
-
-    # Number of nodes in 1D and 2D.
-    nNode1D = int(nPoly+1)
-    nNode2D = nNode1D*nNode1D
-    
-    # Start and end nodal indices. NOTE, start is inclusive, end is exclusive.
-    I0 = int(nNode2D-nNode1D)
-    I1 = int(nNode2D)
-
-    # Form the clockwise local nodal indices.
-    node_idx = np.arange(I0, I1, dtype=int )
-
-    # Search for the indices, if they can be found.
-    info = FindElementMarker(elements, elem_idx, node_idx, m, tag)
-
-    # Return the information if found, otherwise its an empty list. 
-    return info
-
-
-# Function that processes whether a marker belongs to a boundary: IMAX. 
-def CheckMarkerElementIMAX(elements, nxElem, nyElem, nPoly, m):
-
-    # Face tag.
-    tag = IMAX
-
-    # Start and stop element indices. NOTE, start is inclusive, end is exclusive.
-    I0 = int(nxElem-1)
-    I1 = int(nxElem*nyElem)
-
-    # Form the element indices.
-    elem_idx = np.arange(I0, I1, nxElem, dtype=int)
+    # Deduce number of elements.
+    nxElem = DetermineNumberOfElements(nx, nPoly) 
+    nyElem = DetermineNumberOfElements(ny, nPoly) 
 
-    # Number of nodes in 1D and 2D.
-    nNode1D = int(nPoly+1)
-    nNode2D = nNode1D*nNode1D
-    
-    # Start and stop nodal indices. NOTE, start is inclusive, end is exclusive.
-    I0 = int(nNode2D-1)
-    I1 = int(nPoly-1)
+    # Total number of (unique) indices on the entire boundary.
+    ns = 2*nx + 2*ny - 4
 
-    # Form the clockwise local nodal indices.
-    node_idx = np.arange(I0, I1, -nNode1D, dtype=int )
+    # Position of every node on the boundary.
+    pos = geo.SurfacePositionClockwise(m, nx, ny)
+    p   = pos[:,0]
 
-    # Search for the indices, if they can be found.
-    info = FindElementMarker(elements, elem_idx, node_idx, m, tag)
+    # The clockwise boundary is split into: JMAX, IMAX, JMIN and IMIN.
+    isJMAX = p <  nx-1
+    isIMAX = (p >= nx-1)        & (p < nx+ny-2)
+    isJMIN = (p >= nx+ny-2)     & (p < 2*nx+ny-3)
+    isIMIN = p >= 2*nx+ny-3
 
-    # Return the information if found, otherwise its an empty list. 
-    return info
-   
+    # Distance of the first node from the start of its boundary, which must coincide with an element vertex.
+    d = np.select( [isJMAX, isIMAX, isJMIN, isIMIN], [p, p-(nx-1), p-(nx+ny-2), p-(2*nx+ny-3)] )
 
-# Function that processes whether a marker belongs to a boundary: IMIN. 
-def CheckMarkerElementIMIN(elements, nxElem, nyElem, nPoly, m):
-    
-    # Face tag.
-    tag = IMIN
+    # Ensure every face of the marker starts on the boundary, at an element vertex.
+    if np.any(p < 0) or np.any(d % nPoly != 0):
+        sys.exit("Marker could not be converted from Plot3D to AS3.")
 
-    # Start and stop element indices. NOTE, start is inclusive, end is exclusive.
-    I0 = int(0)
-    I1 = int(nxElem*nyElem-nxElem+1)
+    # Ensure the remaining nodal indices of every face follow the boundary, in the clockwise direction.
+    if not np.array_equal( pos, (p[:,np.newaxis] + np.arange(nNode, dtype=int)) % ns ):
+        sys.exit("Nodal indices are incorrect, check clockwise convention.")
 
-    # Form the element indices.
-    elem_idx = np.arange(I0, I1, nxElem, dtype=int)
+    # Element index along the boundary, as counted from the start of the boundary.
+    k = d // nPoly
 
-    # Number of nodes in 1D and 2D.
-    nNode1D = int(nPoly+1)
-    nNode2D = nNode1D*nNode1D
-    
-    # Start and end nodal indices. NOTE, start is inclusive, end is exclusive.
-    I0 = int(0)
-    I1 = int(nNode2D-nNode1D+1)
+    # Element indices in both directions. 
+    # JMAX runs along i on the top, IMAX down along j on the right,
+    # JMIN back along i on the bottom and IMIN up along j on the left.
+    ie = np.select( [isJMAX, isIMAX, isJMIN, isIMIN], [k, nxElem-1, nxElem-1-k, 0] )
+    je = np.select( [isJMAX, isIMAX, isJMIN, isIMIN], [nyElem-1, nyElem-1-k, 0, k] )
 
-    # Form the clockwise local nodal indices.
-    node_idx = np.arange(I0, I1, nNode1D, dtype=int )
+    # Face tag of every face.
+    tag = np.select( [isJMAX, isIMAX, isJMIN, isIMIN], [JMAX, IMAX, JMIN, IMIN] )
 
-    # Search for the indices, if they can be found.
-    info = FindElementMarker(elements, elem_idx, node_idx, m, tag)
+    # Return the element and face of every marker face.
+    return np.stack( (je*nxElem + ie, tag), axis=1 )
 
-    # Return the information if found, otherwise its an empty list. 
-    return info
- 
 
-# Function that returns the info of the element belonging to a marker, if found.
-def FindElementMarker(elements, elem_idx, node_idx, m, tag):
+# Function that verifies an AS3 grid against the Plot3D grid and markers it is converted from. The AS3
+# coordinates are compared in chunks of at most nChunk elements, in the precision of the AS3 grid, so 
+# memory-mapped grids are streamed. Returns a list of the mismatches found, which is empty if they agree.
+def VerifyGridPlot3DToAS3(data, marker_p3d, grid_as3, nPoly, nChunk=NELEM_CHUNK):
 
-    # Loop over all element indices and check if input marker is on input side.
-    for i in elem_idx:
-        if elements[i][node_idx[0]] == m[0]:
-            if np.array_equal( elements[i][node_idx], m ):
-                return [i,tag] 
-            else:
-                sys.exit("Nodal indices are incorrect, check clockwise convention.")
-
-    # Marker does not belong to the current boundary, return an emtpy list.
-    return []
+    # Extract the data variables, explicitly.
+    xx = grid_as3[0]; yy = grid_as3[1]; mm = grid_as3[2]
 
+    # Extract the number of points per dimension.
+    nx = data[3][0]; ny = data[3][1]
 
+    # Deduce number of elements.
+    nxElem = DetermineNumberOfElements(nx, nPoly) 
+    nyElem = DetermineNumberOfElements(ny, nPoly) 
+    nElem  = nxElem*nyElem
 
+    # Ensure the sizes are consistent, otherwise nothing else can be compared.
+    if grid_as3[3] != nxElem or grid_as3[4] != nyElem:
+        return ["Number of elements differ: " + str((grid_as3[3], grid_as3[4])) + " instead of " + str((nxElem, nyElem)) + "."]
+    if xx.shape != (nElem, (nPoly+1)**2) or yy.shape != xx.shape:
+        return ["Number of nodes per element differ from polynomial order " + str(nPoly) + "."]
+
+    # Initialize the list of mismatches.
+    mismatch = []
+
+    # Compare both coordinates, one chunk of elements at a time. Only the first mismatch is reported.
+    for name, v_as3, v_p3d in [("x", xx, data[0]), ("y", yy, data[1])]:
+        for e0 in range(0, nElem, nChunk):
+
+            # Plot3D coordinates of this chunk of elements, in the precision of the AS3 grid.
+            iElem = np.arange(e0, min(e0+nChunk, nElem), dtype=int)
+            v     = np.asarray( v_p3d[ElementConnectivity(iElem, nx, ny, nPoly)], dtype=v_as3.dtype )
+
+            # Find the elements that do not match.
+            bad = np.flatnonzero( np.any( v_as3[e0:e0+len(iElem)] != v, axis=1 ) )
+            if len(bad) > 0:
+                mismatch.append( name + "-coordinates differ, starting at element " + str(e0 + bad[0]) + "." )
+                break
+
+    # Expected markers in AS3 format.
+    marker_as3 = ConvertMarkerFromPlot3DToAS3(marker_p3d, nx, ny, nPoly)
+
+    # Compare the markers, which must be in the same order.
+    if len(mm) != len(marker_as3):
+        mismatch.append( "Number of markers differ: " + str(len(mm)) + " instead of " + str(len(marker_as3)) + "." )
+    for m, r in zip(mm, marker_as3):
+        if m[0] != r[0]:
+            mismatch.append( "Marker " + m[0] + " does not match marker " + r[0] + " of the Plot3D grid." )
+        elif not np.array_equal( np.asarray(m[1]).reshape(-1,2), r[1] ):
+            mismatch.append( "Faces of marker " + m[0] + " differ." )
+
+    # Return the mismatches found.
+    return mismatch
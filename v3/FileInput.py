@@ -1,84 +1,767 @@
 # Imported libraries/functions.
 import os
 import sys
-import struct
 import numpy as np
+import GeometryUtility as geo
+from ElementUtility import IMIN, IMAX, JMIN, JMAX
 
 
-# Function that reads a (single zone) Plot3D binary grid file.
-def ImportSingleZoneBinaryPlot3D(filename):
-    
-    # Number of bytes of int and double, as per written convention.
-    nByteInt = int(4); nByteDouble = int(8)
+# Number of characters read at once, when parsing an ASCII file.
+NCHAR_CHUNK = int(2**26)
+
+
+# Class that holds a single block of a Plot3D binary grid file. Only its dimensions are
+# known upon creation, the coordinates are decoded the first time they are requested.
+# It can be indexed like the (x,y,z,info) tuple of ImportSingleZoneBinaryPlot3D. Since it
+# holds its own offset, it can also be used as the grid zone <file>:<block> of its block.
+class BlockPlot3D:
+
+    # Constructor, based on the location of the block data inside the file.
+    def __init__(self, filename, offset, sym, precision, info, mmap=False, block=-1):
+
+        # Name of the file, index of the block within it and byte offset of the block coordinates.
+        self.filename = filename
+        self.block    = int(block)
+        self.offset   = int(offset)
+
+        # Byte-reading format of the coordinates.
+        self.sym = sym; self.precision = int(precision)
+        self.dtype = np.dtype( sym + "f" + str(precision) )
+
+        # Number of points per dimension, as well as in total.
+        self.info   = info
+        self.nPoint = int( info[0]*info[1]*info[2] )
+
+        # Whether the coordinates are memory-mapped or copied into memory.
+        self.mmap = mmap
+
+        # Coordinates, which are not decoded yet.
+        self.xyz = None
+
+    # Function that decodes the coordinates of this block, if not done already.
+    def Load(self):
+
+        # Extract the data, ordered as: x-coordinates, y-coordinates and lastly z-coordinates.
+        if self.xyz is None:
+            if self.mmap:
+                self.xyz = np.memmap( self.filename, dtype=self.dtype, mode='r',
+                                      offset=self.offset, shape=(3, self.nPoint) )
+            else:
+                with open(self.filename, mode='rb') as file:
+                    file.seek(self.offset)
+                    xyz = np.fromfile( file, dtype=self.dtype, count=3*self.nPoint )
+                if len(xyz) != 3*self.nPoint:
+                    sys.exit("End of file reached unexpectedly.")
+                # Convert to native byte order, while keeping the precision of the file.
+                self.xyz = xyz.reshape(3, self.nPoint).astype( self.dtype.newbyteorder('=') )
+
+        # Return the data.
+        return self.xyz[0], self.xyz[1], self.xyz[2], self.info
+
+    # Function that reads only the coordinates on the boundary of this block, based on the
+    # clockwise convention. The file is memory-mapped, so the interior points are never read.
+    def LoadBoundary(self):
+
+        # Surface indices of this block.
+        s = geo.SurfaceIndicesClockwise(self.info[0], self.info[1])
+
+        # Use the decoded coordinates, if available. Otherwise, map the file temporarily.
+        xyz = self.xyz
+        if xyz is None:
+            xyz = np.memmap( self.filename, dtype=self.dtype, mode='r',
+                             offset=self.offset, shape=(3, self.nPoint) )
+
+        # Gather the boundary coordinates, converted to native double precision.
+        xs = xyz[0][s].astype(float)
+        ys = xyz[1][s].astype(float)
+
+        # Return the coordinates on the boundary.
+        return xs, ys
+
+    # Function that releases the decoded coordinates of this block.
+    def Unload(self):
+        self.xyz = None
+
+    # Name of this block as a grid zone, i.e. <file>:<block>.
+    def __str__(self):
+        if self.block < 0:
+            return self.filename
+        return self.filename + ":" + str(self.block)
+
+    # Number of entries, as in the (x,y,z,info) tuple.
+    def __len__(self):
+        return 4
+
+    # Entries of the (x,y,z,info) tuple. The info entry does not decode the coordinates.
+    def __getitem__(self, i):
+        if i == 3 or i == -1:
+            return self.info
+        return self.Load()[i]
 
-    # Open and read all the binary data.
+
+# Function that reads the header of a (multi-block) Plot3D binary grid file and
+# returns the offset table of all its blocks, without reading their coordinates.
+def IndexBinaryPlot3D(filename):
+
+    # Number of bytes of int, as per written convention.
+    nByteInt = int(4)
+
+    # Open the file and only read its record markers.
     with open(filename, mode='rb') as file:
-        buffer = file.read()
 
-    # Assume the default is little endian.
-    endian = "little"; sym = "<"
+        # Read the first record, which contains the number of blocks.
+        buffer = file.read(3*nByteInt)
+        if len(buffer) != 3*nByteInt:
+            sys.exit("Could not read the file, header is incomplete.")
 
-    # Read first integer and ensure it is has the size of 4, since 1 int = 4 bytes, by written convention.
-    if int.from_bytes( buffer[0:4], endian ) != nByteInt:
-        endian = "big"; sym = ">"
+        # Assume the default is little endian.
+        endian = "little"; sym = "<"
+
+        # Read first integer and ensure it is has the size of 4, since 1 int = 4 bytes, by written convention.
         if int.from_bytes( buffer[0:4], endian ) != nByteInt:
-            sys.exit("Could not read the file, unknown first value.")
+            endian = "big"; sym = ">"
+            if int.from_bytes( buffer[0:4], endian ) != nByteInt:
+                sys.exit("Could not read the file, unknown first value.")
 
-    # Extract the header information about the grid.
-    j = nByteInt; v = []
-    for i in range(8):
-        v.append( int.from_bytes( buffer[j:j+nByteInt], endian ) )
-        j += nByteInt
+        # Number of blocks in this file.
+        nBlock = int.from_bytes( buffer[4:8], endian )
+        if nBlock < 1 or int.from_bytes( buffer[8:12], endian ) != nByteInt:
+            sys.exit("Could not read the number of blocks.")
 
-    # First record is the number of blocks, must be one.
-    if v[0] != 1:
-        sys.exit("Number of blocks must be set to one (for now).")
+        # Read the second record, which contains the number of points per block in all three dimensions.
+        nInt = 3*nBlock + 2
+        v = np.fromfile( file, dtype=sym+"i4", count=nInt )
+        if len(v) != nInt or v[0] != 3*nBlock*nByteInt or v[-1] != v[0]:
+            sys.exit("Could not read the number of points per block.")
 
-    # Extract the number of points in all three dimensions. Ensure the z-dimension is trivial.
-    nx = v[3]; ny = v[4]; nz = v[5]
-    if nz != 1:
-        sys.exit("Grid must be two-dimensional, only one point in the z-direction is expected.")
+        # Number of points per block, one row per block.
+        n = v[1:-1].reshape(nBlock, 3).astype(int)
 
-    # Determine the precision of the data.
-    precision = int( v[-1]/(3*nx*ny*nz) )
+        # Offset of the coordinates and their precision, per block.
+        offset    = np.zeros( nBlock, dtype=np.int64 )
+        precision = np.zeros( nBlock, dtype=int )
 
-    # For now, force only double precision.
-    if precision != nByteDouble:
-        sys.exit("Only double precision is supported.")
+        # Starting position of the first block record.
+        j = file.tell()
 
-    # Total number of grid points expected.
-    nPoint = int( nx*ny*nz )
+        # Walk over the record markers of the blocks.
+        for b in range(nBlock):
 
-    # Byte-reading format for double-precision.
-    sym += str(nPoint) + "d"
+            # Leading record marker, i.e. the total bytes of the data.
+            file.seek(j)
+            nByte = int.from_bytes( file.read(nByteInt), endian )
 
-    # Extract the remaining data. Starting from the x-coordinates.
-    I0 = int(j); I1 = int(I0 + nPoint*nByteDouble)
-    x = np.array( struct.unpack( sym, buffer[I0:I1] ) )
+            # Deduce the precision of the data.
+            precision[b] = int( nByte/(3*n[b].prod()) )
+            if precision[b]*3*n[b].prod() != nByte:
+                sys.exit("Block size is inconsistent with its number of points.")
 
-    # Then, the y-coordinates.
-    J0 = I1; J1 = int(J0 + nPoint*nByteDouble)
-    y = np.array( struct.unpack( sym, buffer[J0:J1] ) )
+            # Consistency check, based on the trailing record marker of this block.
+            file.seek(j + nByteInt + nByte)
+            if int.from_bytes( file.read(nByteInt), endian ) != nByte:
+                sys.exit("Last entry of a block should correspond to the total bytes of the data.")
 
-    # Lastly, the z-coordinates.
-    K0 = J1; K1 = int(K0 + nPoint*nByteDouble)
-    z = np.array( struct.unpack( sym, buffer[K0:K1] ) )
-    
-    # Consistency check, based on the last integer entry within the writing convention.
-    if int.from_bytes(buffer[-4:-1], endian) != v[-1]:
-        sys.exit("Last entry in file should correspond to the total bytes of the data.")
-    
-    # Array containing the information of the grid.
-    info = np.array( (nx, ny, nz) ) 
+            # Book-keep the start of the coordinates and move to the next block.
+            offset[b] = j + nByteInt
+            j += nByte + 2*nByteInt
+
+    # Return the byte-order symbol, the number of points, data offsets and precision of all blocks.
+    return sym, n, offset, precision
+
+
+# Function that returns all blocks of a (multi-block) Plot3D binary grid file. The blocks are
+# loaded lazily, so only the coordinates of the blocks that are accessed are ever decoded.
+def ImportMultiBlockBinaryPlot3D(filename, mmap=False):
+
+    # Number of bytes of float and double, as per written convention.
+    nByteFloat = int(4); nByteDouble = int(8)
+
+    # Parse the header once, which gives the offset table of all the blocks.
+    sym, n, offset, precision = IndexBinaryPlot3D(filename)
+
+    # Create the (unloaded) blocks.
+    blocks = []
+    for b in range(len(n)):
+
+        # Extract the number of points in all three dimensions. Ensure the z-dimension is trivial.
+        nx = n[b][0]; ny = n[b][1]; nz = n[b][2]
+        if nz != 1:
+            sys.exit("Grid must be two-dimensional, only one point in the z-direction is expected.")
+
+        # Only single and double precision are supported. Single precision is kept as is,
+        # it is only converted to double precision when the AS3 grid is written.
+        if precision[b] != nByteFloat and precision[b] != nByteDouble:
+            sys.exit("Only single and double precision are supported.")
+
+        # Array containing the information of the grid.
+        info = np.array( (nx, ny, nz) )
+
+        # Book-keep this block.
+        blocks.append( BlockPlot3D( filename, offset[b], sym, precision[b], info, mmap, b ) )
+
+    # Return the blocks.
+    return blocks
+
+
+# Function that reads a (single zone) Plot3D binary grid file.
+# If mmap is true, the file is memory-mapped and x, y, z are read-only views
+# in the byte order of the file, instead of being copied into memory.
+def ImportSingleZoneBinaryPlot3D(filename, mmap=False):
+
+    # Index the blocks of the file.
+    blocks = ImportMultiBlockBinaryPlot3D(filename, mmap)
+
+    # Number of blocks, must be one.
+    if len(blocks) != 1:
+        sys.exit("Number of blocks must be set to one, use ImportMultiBlockBinaryPlot3D instead.")
+
+    # Return the data.
+    return blocks[0].Load()
+
+
+# Function that returns all the numbers of an ASCII file, one chunk at a time. Each chunk is
+# tokenized in bulk and is independent of the line layout, since all whitespace is a separator.
+def TokenizeASCII(file, nChunk=NCHAR_CHUNK):
+
+    # Remainder of the previous chunk, which may contain a number that is cut in half.
+    rest = ""
+
+    # Read the file in chunks.
+    while True:
+        buffer = file.read(nChunk)
+        if len(buffer) == 0:
+            break
+        buffer = rest + buffer
+
+        # Only parse up to the last whitespace, the remainder is kept for the next chunk.
+        i = max( buffer.rfind(c) for c in " \t\r\n" )
+        if i < 0:
+            rest = buffer
+            continue
+        rest = buffer[i:]
+
+        # Tokenize this chunk, unless it is only whitespace.
+        if len(buffer[:i].strip()) > 0:
+            yield np.fromstring( buffer[:i], sep=" " )
+
+    # Tokenize whatever is left.
+    if len(rest.strip()) > 0:
+        yield np.fromstring( rest, sep=" " )
+
+
+# Function that reads all blocks of a (multi-block) Plot3D ASCII grid file. The file is streamed
+# in large chunks and the blocks are returned in the same (x,y,z,info) format as the binary readers.
+# If block is non-negative, only that block is stored and returned, as the single entry, and the
+# file is only read up to the end of that block.
+def ImportMultiBlockASCIIPlot3D(filename, block=-1):
+
+    # Open file to start extracting the data.
+    with open(filename, mode='r') as file:
+
+        # Header and data values, respectively.
+        head = np.zeros( 0, dtype=float )
+        data = None
+
+        # Stream over all the numbers in the file.
+        for tokens in TokenizeASCII(file):
+
+            # Extract the header, i.e. the number of blocks and their number of points in x,y,z.
+            if data is None:
+                head = np.concatenate( (head, tokens) )
+                if len(head) == 0:
+                    continue
+
+                # First integer is the number of blocks.
+                nBlock = int( head[0] )
+                if nBlock < 1 or nBlock != head[0]:
+                    sys.exit("Could not read the number of blocks.")
+
+                # Wait until the entire header is read.
+                if len(head) < 1 + 3*nBlock:
+                    continue
+
+                # Number of points per block, one row per block.
+                n = head[1:1+3*nBlock].reshape(nBlock, 3).astype(int)
+                if np.any( n < 1 ):
+                    sys.exit("Could not read the number of points per block.")
+
+                # Range of blocks that are stored, either all of them or only the requested one.
+                if block >= nBlock:
+                    sys.exit("Block " + str(block) + " does not exist in grid file: " + filename)
+                b0 = 0 if block < 0 else block
+                b1 = nBlock if block < 0 else block + 1
+
+                # Range of values of these blocks, ordered as x,y,z per block, and their memory.
+                nValue = 3*np.concatenate( ([0], np.cumsum( n.prod(axis=1) )) )
+                lo = int( nValue[b0] ); hi = int( nValue[b1] )
+                data = np.zeros( hi - lo, dtype=float )
+
+                # Remaining values belong to the data, of which s values are read so far.
+                tokens = head[1+3*nBlock:]; s = 0
+
+            # Store the values that fall within the requested blocks.
+            if s + len(tokens) > nValue[-1]:
+                sys.exit("More values than expected in the grid file.")
+            a = min( max(lo - s, 0), len(tokens) ); b = min( max(hi - s, 0), len(tokens) )
+            data[s+a-lo:s+b-lo] = tokens[a:b]
+            s += len(tokens)
+
+            # Stop reading, once the requested block is complete.
+            if block >= 0 and s >= hi:
+                break
+
+        # Ensure all the data is read.
+        if data is None or s < hi or ( block < 0 and s != nValue[-1] ):
+            sys.exit("End of file reached unexpectedly.")
+
+    # Split the data into the blocks, without copying.
+    blocks = []
+    for b in range(b0, b1):
+
+        # Extract the number of points in all three dimensions. Ensure the z-dimension is trivial.
+        nx = n[b][0]; ny = n[b][1]; nz = n[b][2]
+        if nz != 1:
+            sys.exit("Grid must be two-dimensional, only one point in the z-direction is expected.")
+
+        # Coordinates of this block, ordered as: x-coordinates, y-coordinates and lastly z-coordinates.
+        nPoint = int( nx*ny*nz )
+        xyz = data[nValue[b]-lo:nValue[b+1]-lo].reshape(3, nPoint)
+
+        # Book-keep this block.
+        blocks.append( (xyz[0], xyz[1], xyz[2], np.array( (nx, ny, nz) )) )
+
+    # Return the blocks.
+    return blocks
+
+
+# Function that returns whether a Plot3D grid file is binary, based on its leading record marker.
+def IsBinaryPlot3D(filename):
+    with open(filename, mode='rb') as file:
+        buffer = file.read(4)
+    return len(buffer) == 4 and 4 in ( int.from_bytes(buffer, "little"), int.from_bytes(buffer, "big") )
+
+
+# Function that returns all blocks of a (multi-block) Plot3D grid file, which is either binary or ASCII.
+def ImportMultiBlockPlot3D(filename, mmap=False):
+    if IsBinaryPlot3D(filename):
+        return ImportMultiBlockBinaryPlot3D(filename, mmap)
+    return ImportMultiBlockASCIIPlot3D(filename)
+
+
+# Function that returns the number of points per dimension of all the blocks in a Plot3D grid file, 
+# which is either binary or ASCII, one row per block. Only the header of the file is read.
+def DimensionsPlot3D(filename):
+
+    # Binary files are indexed, which only reads their header.
+    if IsBinaryPlot3D(filename):
+        return IndexBinaryPlot3D(filename)[1]
+
+    # For ASCII files, the header is the number of blocks, followed by their number of points in x,y,z.
+    head = np.zeros( 0, dtype=float )
+    with open(filename, mode='r') as file:
+        for tokens in TokenizeASCII(file, 4096):
+            head = np.concatenate( (head, tokens) )
+            if len(head) > 0 and len(head) >= 1 + 3*int( head[0] ):
+                return head[1:1+3*int( head[0] )].reshape(-1, 3).astype(int)
+
+    # Issue an error, since the header is incomplete.
+    sys.exit("Could not read the number of points per block.")
+
+
+# Function that returns the number of blocks in a Plot3D grid file, which is either binary or ASCII.
+# Only the header of the file is read.
+def NumberOfBlocksPlot3D(filename):
+    return len( DimensionsPlot3D(filename) )
+
+
+# Function that returns the total number of points of a grid zone. Only the header of its file is read.
+def NumberOfPointsZone(zone):
+    if isinstance(zone, BlockPlot3D):
+        return zone.nPoint
+    filename, block = SplitZone(zone)
+    return int( DimensionsPlot3D(filename)[max(block, 0)].prod() )
+
+
+# Function that splits a grid zone into its grid file and the index of its block. A single block of a 
+# multi-block file is specified as <file>:<block>, otherwise the block index is -1.
+def SplitZone(zone):
+    filename, sep, block = str(zone).rpartition(':')
+    if sep and block.isdigit():
+        return filename, int(block)
+    return str(zone), -1
+
+
+# Function that returns the name of a grid zone, used for its marker and AS3 grid files. This is the name of
+# its grid file, without the directory and extension. A block of a multi-block file is named <name>_zone_<block>.
+def ZoneName(zone):
+    filename, block = SplitZone(zone)
+    fn = os.path.basename(filename).split('.')[0]
+    if block < 0:
+        return fn
+    return fn + "_zone_" + str(block)
+
+
+# Function that returns the grid zones of the grid files. Every multi-block file is expanded into its blocks.
+# Binary files are indexed once, of which the blocks are returned as BlockPlot3D, which hold their own offset
+# and serve as the zone <file>:<block>. Blocks of ASCII files are returned as <file>:<block> instead. 
+# Single-block files and already selected blocks are kept as is.
+def ExpandGridZones(files, mmap=False):
+    zones = []
+    for file in files:
+        if SplitZone(file)[1] >= 0:
+            zones.append(file)
+        elif IsBinaryPlot3D(file):
+            blocks = ImportMultiBlockBinaryPlot3D(file, mmap)
+            zones.extend( blocks if len(blocks) > 1 else [file] )
+        else:
+            nBlock = NumberOfBlocksPlot3D(file)
+            zones.extend( [file + ":" + str(b) for b in range(nBlock)] if nBlock > 1 else [file] )
+    return zones
+
+
+# Function that returns the data of a single block, out of all the blocks of a grid file. 
+# Binary blocks are only decoded now, whereas ASCII blocks are read already.
+def SelectBlockPlot3D(blocks, block, filename):
+
+    # Ensure the block exists.
+    if block >= len(blocks):
+        sys.exit("Block " + str(block) + " does not exist in grid file: " + filename)
 
-    
     # Return the data.
-    return x,y,z,info
+    if isinstance(blocks[block], BlockPlot3D):
+        return blocks[block].Load()
+    return blocks[block]
+
+
+# Function that reads a (single zone) Plot3D grid file, which is either binary or ASCII. The zone is 
+# either a file with a single block, or a block of a multi-block file, specified as <file>:<block>
+# or as a BlockPlot3D, see ExpandGridZones.
+def ImportSingleZonePlot3D(zone, mmap=False):
+
+    # A block that is indexed already is only decoded, without reading the header of its file again.
+    if isinstance(zone, BlockPlot3D):
+        return BlockPlot3D( zone.filename, zone.offset, zone.sym, zone.precision, zone.info, mmap, zone.block ).Load()
+
+    # Grid file of this zone and the index of its block, if specified.
+    filename, block = SplitZone(zone)
+
+    # ASCII files have no random access, hence these are only read up to the end of the selected block.
+    if block >= 0 and not IsBinaryPlot3D(filename):
+        return ImportMultiBlockASCIIPlot3D(filename, block)[0]
+
+    # Index all the blocks. Binary blocks are lazy, whereas ASCII blocks are read entirely.
+    blocks = ImportMultiBlockPlot3D(filename, mmap)
+
+    # Without a block index, the file must contain a single block.
+    if block < 0:
+        if len(blocks) != 1:
+            sys.exit("Grid file " + filename + " contains " + str(len(blocks)) + " blocks, select one as <file>:<block>.")
+        block = 0
+
+    # Return the data of the block.
+    return SelectBlockPlot3D(blocks, block, filename)
+
+
+# Function that imports the grid zones lazily. Only the input zone, with index IDX, is decoded
+# entirely. The remaining zones are only indexed, such that drawing them reads their boundary.
+# Note, ASCII zones have no random access, so these are always decoded entirely. If the input 
+# zone is a block of a multi-block file, the remaining blocks of that file are neighbours as well.
+def ImportGridZones(zones, IDX, mmap=False):
+
+    # Initialize the zone data and the index of the input zone within it.
+    data = []; iZone = -1
+
+    # Loop over the files, noting that each neighbouring file may contain several blocks.
+    for i in range( len(zones) ):
+        if i == IDX:
+            filename, block = SplitZone(zones[i])
+            if block < 0:
+                iZone = len(data)
+                data.append( ImportSingleZonePlot3D(zones[i], mmap) )
+            else:
+                # Index, or read if ASCII, the file only once, of which only the input block is decoded.
+                blocks = ImportMultiBlockPlot3D(filename, mmap)
+                zone   = SelectBlockPlot3D(blocks, block, filename)
+                iZone  = len(data) + block
+                data.extend( blocks )
+                data[iZone] = zone
+        else:
+            data.extend( ImportMultiBlockPlot3D(zones[i]) )
+
+    # Return the zone data and the index of the input zone.
+    return data, iZone
+
+
+# Function that extracts the value of a "KEY = value" line, as used in the marker files.
+def ReadKeyValue(line, key):
+    entry = line.split('=')
+    if len(entry) != 2 or entry[0].strip() != key:
+        sys.exit("Expected " + key + " in marker file.")
+    return entry[1].strip()
+
+
+# Function that reads the markers (of a single zone) from the ASCII file written by ExportMarkerASCII.
+def ImportMarkerASCII(filename, nPoly):
+
+    # Number of nodes in 1D over an element.
+    npts = int(nPoly+1)
+
+    # Read all the lines at once.
+    with open(filename, mode='r') as file:
+        lines = file.read().splitlines()
+
+    # Number of markers in total.
+    nMarker = int( ReadKeyValue(lines[0], "NMARK") )
+
+    # Loop over the markers and read them separately.
+    marker = []; s = 1
+    for i in range(nMarker):
+
+        # Name of this marker and its number of faces.
+        tag   = ReadKeyValue(lines[s], "MARKER_TAG")
+        nFace = int( ReadKeyValue(lines[s+1], "NFACE") )
+        s += 2
+
+        # Parse all the nodal indices of this marker at once, one row per face.
+        block = ",".join( lines[s:s+nFace] )
+        faces = np.array( block.split(',') if nFace > 0 else [], dtype=int )
+        if len(faces) != nFace*npts:
+            sys.exit("Inconsistent number of nodes per face on a marker is detected.")
+        faces = faces.reshape(nFace, npts)
+        s += nFace
+
+        # Internal faces share their end nodes, which are therefore only kept once.
+        if not np.array_equal( faces[1:,0], faces[:-1,-1] ):
+            sys.exit("Faces on a marker are not connected.")
+        ind = np.concatenate( (faces[:1,0], faces[:,1:].ravel()) )
+
+        # Book-keep marker information.
+        marker.append( [tag, ind] )
+
+    # Return the marker data.
+    return marker
+
+
+# Function that reads the markers (of a single zone) from the binary file written by ExportMarkerBinary.
+# If mmap is true, the indices are read-only views into the memory-mapped file.
+def ImportMarkerBinary(filename, nPoly, mmap=True):
+
+    # Marker binary file magic number, as well as the length of strings used.
+    MARKER_MAGIC_NUMBER = int( 3735929055 )
+    CGNS_STRING_SIZE    = 33
+
+    # Map, or read, the entire file as bytes.
+    if mmap:
+        buffer = np.memmap( filename, dtype=np.uint8, mode='r' )
+    else:
+        buffer = np.fromfile( filename, dtype=np.uint8 )
+
+    # Function that reads n little-endian int32/uint32 values from position j.
+    def Read(j, n, dtype="<u4"):
+        if j + 4*n > len(buffer):
+            sys.exit("End of marker file reached unexpectedly.")
+        return buffer[j:j+4*n].view(dtype)
+
+    # Read the header: magic number, polynomial order and number of markers.
+    v = Read(0, 3)
+    if v[0] != MARKER_MAGIC_NUMBER:
+        sys.exit("Could not read the marker file, unknown magic number.")
+    if v[1] != nPoly:
+        sys.exit("Polynomial order of the marker file does not match.")
+    nMarker = int(v[2])
+
+    # Loop over the markers and read them separately.
+    marker = []; j = 12
+    for i in range(nMarker):
+
+        # Name of this marker, without its padding.
+        tag = bytes( buffer[j:j+CGNS_STRING_SIZE] ).split(b'\0')[0].decode('utf-8')
+        j  += CGNS_STRING_SIZE
+
+        # Number of nodes on this marker and their indices.
+        nNode = int( Read(j, 1)[0] ); j += 4
+        ind   = Read(j, nNode, "<i4"); j += 4*nNode
 
+        # Book-keep marker information.
+        marker.append( [tag, ind] )
 
-# Function that returns the path to all grid files and the index of the input file.
+    # Return the marker data.
+    return marker
+
+
+# Function that reads an AS3 grid from the binary file written by WriteAS3GridBinaryFormat. The grid is
+# returned in the same form as it is written: x- and y-coordinates of size (nElem,nNode2D), the markers
+# with their (iElem,iBoundary) face table and the number of elements per dimension. If mmap is true, 
+# the coordinates and faces are read-only views into the memory-mapped file, hence nothing is copied.
+def ImportAS3GridBinaryFormat(filename, mmap=True):
+
+    # AS3 file magic numbers, without and with the precision of the coordinates in the header.
+    AS3_MAGIC_NUMBER           = int( 3735929054 )
+    AS3_MAGIC_NUMBER_PRECISION = int( 3735929056 )
+
+    # Length of strings used, using the CGNS convention.
+    CGNS_STRING_SIZE = 33
+
+    # Map, or read, the entire file as bytes.
+    if mmap:
+        buffer = np.memmap( filename, dtype=np.uint8, mode='r' )
+    else:
+        buffer = np.fromfile( filename, dtype=np.uint8 )
+
+    # Function that reads n little-endian values of the given type (of nByte bytes) from position j.
+    def Read(j, n, dtype="<u4", nByte=4):
+        if j + nByte*n > len(buffer):
+            sys.exit("End of AS3 file reached unexpectedly.")
+        return buffer[j:j+nByte*n].view(dtype)
+
+    # Read the magic number and deduce the precision of the coordinates, which is double by default.
+    magic = Read(0, 1)[0]; j = 4; precision = 8
+    if magic == AS3_MAGIC_NUMBER_PRECISION:
+        precision = int( Read(j, 1)[0] ); j += 4
+    elif magic != AS3_MAGIC_NUMBER:
+        sys.exit("Could not read the AS3 file, unknown magic number.")
+    if precision != 4 and precision != 8:
+        sys.exit("Only single and double precision are supported.")
+
+    # Read the dimension of the grid, number of elements per dimension and nodes per element.
+    v = Read(j, 4); j += 16
+    if v[0] != 2:
+        sys.exit("Only 2D AS3 grids are supported.")
+    nx = int(v[1]); ny = int(v[2]); nNode2D = int(v[3])
+
+    # Number of elements and coordinates per dimension.
+    nElem = nx*ny; n = nElem*nNode2D
+
+    # Read the x- and y-coordinates, one row per element.
+    dtype = "<f" + str(precision)
+    xx = Read(j, n, dtype, precision).reshape(nElem, nNode2D); j += precision*n
+    yy = Read(j, n, dtype, precision).reshape(nElem, nNode2D); j += precision*n
+
+    # Ensure the local element face convention of the markers is the same as the current one.
+    if not np.array_equal( Read(j, 4), [IMIN, IMAX, JMIN, JMAX] ):
+        sys.exit("Face convention of the AS3 file does not match.")
+    j += 16
+
+    # Number of markers.
+    nMarker = int( Read(j, 1)[0] ); j += 4
+
+    # Loop over the markers and read them separately.
+    marker = []
+    for i in range(nMarker):
+
+        # Name of this marker, without its padding.
+        if j + CGNS_STRING_SIZE > len(buffer):
+            sys.exit("End of AS3 file reached unexpectedly.")
+        tag = bytes( buffer[j:j+CGNS_STRING_SIZE] ).split(b'\0')[0].decode('utf-8')
+        j  += CGNS_STRING_SIZE
+
+        # Number of faces on this marker and their (iElem,iBoundary) information.
+        nFace = int( Read(j, 1)[0] ); j += 4
+        faces = Read(j, 2*nFace).reshape(nFace, 2); j += 8*nFace
+
+        # Book-keep marker information.
+        marker.append( [tag, faces] )
+
+    # Ensure the entire file is consumed.
+    if j != len(buffer):
+        sys.exit("Unexpected trailing data in AS3 file.")
+
+    # Return the AS3 grid, in the same form as it is written.
+    return [xx, yy, marker, nx, ny]
+
+
+# Function that reads the markers (of a single zone), based on the extension of the file.
+def ImportMarker(filename, nPoly):
+    if filename.endswith(".bin"):
+        return ImportMarkerBinary(filename, nPoly)
+    return ImportMarkerASCII(filename, nPoly)
+
+
+# Function that reads the markers (of a single zone) from a declarative specification file, which 
+# only contains the clockwise start and end indices per marker. The format is:
+#   NMARK = <number of markers>
+#   MARKER_TAG = <name>
+#   START = <index of first node>
+#   END = <index of last node>
+# where the last three lines are repeated per marker. If START and END are the same, the marker 
+# encompasses the entire boundary, starting and ending at that index.
+def ImportMarkerSpec(filename, nx, ny):
+
+    # Read all the non-empty lines at once, skipping comments.
+    with open(filename, mode='r') as file:
+        lines = [l for l in file.read().splitlines() if l.strip() and not l.lstrip().startswith('#')]
+
+    # All surface indices of this grid.
+    surf = geo.SurfaceIndicesClockwise(nx, ny)
+
+    # Number of markers in total.
+    nMarker = int( ReadKeyValue(lines[0], "NMARK") )
+    if len(lines) != 3*nMarker + 1:
+        sys.exit("Inconsistent number of entries in marker specification file.")
+
+    # Loop over the markers and deduce their indices.
+    marker = []; s = 1
+    for i in range(nMarker):
+
+        # Name of this marker and its starting and ending indices.
+        tag = ReadKeyValue(lines[s],   "MARKER_TAG")
+        I0  = int( ReadKeyValue(lines[s+1], "START") )
+        I1  = int( ReadKeyValue(lines[s+2], "END") )
+        s  += 3
+
+        # Ensure the indices are on the boundary.
+        p0 = geo.SurfacePositionClockwise(I0, nx, ny)
+        if p0 < 0 or geo.SurfacePositionClockwise(I1, nx, ny) < 0:
+            sys.exit("Marker " + tag + " does not start and end on the boundary.")
+
+        # Extract the indices of the points on this marker. Add the initial point to close a loop.
+        if I0 == I1:
+            ij = surf[ np.arange(p0, p0 + len(surf) + 1) % len(surf) ]
+        else:
+            ij = geo.FindIndicesLineClockwise(I0, I1, nx, ny, surf)
+
+        # Book-keep marker information.
+        marker.append( [tag, ij] )
+
+    # Return the marker data.
+    return marker
+
+
+# Function that returns the existing marker file of a grid file, if any. The most recently modified file
+# is used, such that an edited ASCII or specification file is not hidden by the files derived from it. 
+# In case of equal modification times, the binary file is preferred over the ASCII file, which in turn 
+# is preferred over a specification file.
+def DetermineMarkerFile(gridfile):
+
+    # Name of the grid zone, without the directory and extension.
+    fn = ZoneName(gridfile)
+
+    # Path to the marker files, as written by ExportMarkerASCII and ExportMarkerBinary.
+    path = os.getcwd() + "/marker/marker_" + fn
+
+    # All marker files that exist, in order of preference.
+    files = [path + ext for ext in [".bin", ".txt", ".spec"] if os.path.isfile( path + ext )]
+
+    # No marker file is found, return an empty string.
+    if len(files) == 0:
+        return ""
+
+    # Return the most recently modified marker file, where the first one is kept in case of a tie.
+    return max( files, key=lambda f: os.stat(f).st_mtime_ns )
+
+
+# Function that returns the path to the AS3 grid file of a grid zone, as written by WriteAS3GridBinaryFormat.
+def DetermineAS3File(gridfile):
+    return os.getcwd() + "/grid_AS3/" + ZoneName(gridfile) + ".as3"
+
+
+# Function that returns the path to all grid files and the index of the input file. If the input 
+# is a block of a multi-block file, i.e. <file>:<block>, the block is kept in its path.
 def DetermineGridFiles(file):
 
+    # Separate the input grid file from its block, if any.
+    file, block = SplitZone(file)
+
     # Get the name of the input grid file exclusively.
     bn = os.path.basename(file)
 
@@ -117,6 +800,10 @@ def DetermineGridFiles(file):
     if IDX < 0:
         sys.exit("Could not detect input grid file.")
 
+    # Select the block of the input grid, if specified.
+    if block >= 0:
+        zones[IDX] += ":" + str(block)
+
     # Return the zone files and the index of the input grid.
     return zones, IDX
 
@@ -1,13 +1,21 @@
 # Imported libraries/functions.
+import io
 import os
 import sys
 import struct
 import numpy as np
 from pathlib import Path
-from ElementUtility import IMIN, IMAX, JMIN, JMAX
+from ElementUtility import IMIN, IMAX, JMIN, JMAX, CoordinatesAS3
+from FileInput import ZoneName
+
+# Number of faces formatted at once, when the markers are streamed to file.
+NFACE_CHUNK = int(65536)
+
 
 # Function that writes the markers (of a single zone) as an ASCII file.
-def ExportMarkerASCII(marker, nPoly, gridfile):
+# By default, the entire file is formatted in memory and written at once. If stream
+# is true, it is written marker by marker, in chunks of at most NFACE_CHUNK faces.
+def ExportMarkerASCII(marker, nPoly, gridfile, stream=False):
 
     # Name of output directory of the markers.
     dirMarker = "/marker/"
@@ -18,11 +26,8 @@ def ExportMarkerASCII(marker, nPoly, gridfile):
     # Absolute path to marker folder.
     folder = cwd + dirMarker
 
-    # Extract name of grid file exclusively, without the directory.
-    bn = os.path.basename(gridfile)
-   
-    # Remove the extension of the file.
-    fn = bn.split('.')[0]
+    # Name of the grid zone, without the directory and extension.
+    fn = ZoneName(gridfile)
 
     # Add the complete file name, with extension and directory.
     fn = cwd + dirMarker + "marker_" + fn + ".txt"
@@ -36,15 +41,19 @@ def ExportMarkerASCII(marker, nPoly, gridfile):
     
     # Open file for writing.
     with file.open('w') as f:
+
+        # Destination of the formatted text: either the file directly or a single buffer.
+        buf = f if stream else io.StringIO()
+
         # Number of markers in total.
-        f.write(f"NMARK = {nMarker}\n")
+        buf.write(f"NMARK = {nMarker}\n")
 
         # Loop over the markers and write them separately.
         for i in range(nMarker):
             # Extract marker tag name.
             tag = marker[i][0]
             # Extract marker indices.
-            ind = marker[i][1]
+            ind = np.asarray( marker[i][1] ).ravel()
 
             # Number of nodes in 1D over an element.
             npts = int(nPoly+1)
@@ -59,27 +68,105 @@ def ExportMarkerASCII(marker, nPoly, gridfile):
                 sys.exit("Inconsistent number of elements on a marker is detected.")
 
             # Write the name of the current marker tag.
-            f.write(f"MARKER_TAG = {tag}\n")
+            buf.write(f"MARKER_TAG = {tag}\n")
 
             # Write total number of elements on this marker.
             # Note, in reality, these are the number of faces, not elements. This is 
             # because on corners, 2 faces belong to the same element. So, it is more
             # appropriate to call them faces.
-            f.write(f"NFACE = {nElem}\n")
+            buf.write(f"NFACE = {nElem}\n")
+
+            # Nothing else to write, in case there are no faces.
+            if nElem == 0:
+                continue
+
+            # Nodes on the surface elements, one row per face. The rows overlap by one node, 
+            # since the solution is multiply defined at the internal faces. This is a view.
+            faces = np.lib.stride_tricks.sliding_window_view(ind, npts)[::nPoly]
+
+            # Write their indices, comma-separated and without a trailing comma.
+            if stream:
+                for j in range(0, nElem, NFACE_CHUNK):
+                    np.savetxt(buf, faces[j:j+NFACE_CHUNK], fmt="%d", delimiter=",")
+            else:
+                np.savetxt(buf, faces, fmt="%d", delimiter=",")
 
-            # Loop over the nodes on the surface elements and write their indices.
-            s = 0
-            for j in range(nElem):
-                for k in range(nPoly):
-                    f.write(f"{ind[s+k]},")
-                # Last entry is written here, such that there is not comma and a new line is added.
-                f.write(f"{ind[s+nPoly]}\n")
-                # Offset counter, since the solution is multiply defined at the internal faces.
-                s += nPoly
+        # Write the entire buffer at once.
+        if not stream:
+            f.write( buf.getvalue() )
 
 
-# Function that writes an AS3 grid in binary format. The byte order uses little-endian.
-def WriteAS3GridBinaryFormat(grid_as3, file_p3d):
+# Function that writes the markers (of a single zone) as a binary file, companion of the ASCII file.
+# The byte order uses little-endian. The marker indices are stored as int32, such that they can be memory-mapped.
+def ExportMarkerBinary(marker, nPoly, gridfile):
+
+    # Name of output directory of the markers.
+    dirMarker = "/marker/"
+
+    # Get current working directory.
+    cwd = os.getcwd()
+
+    # Name of the grid zone, without the directory and extension.
+    fn = ZoneName(gridfile)
+
+    # Add the complete file name, with extension and directory.
+    fn = cwd + dirMarker + "marker_" + fn + ".bin"
+
+    # Create output directory, if it doesn't exist. Also, initialize its current file.
+    file = Path(fn)
+    file.parent.mkdir(parents=True, exist_ok=True)
+
+    # Length of strings used, using the CGNS convention.
+    CGNS_STRING_SIZE = 33
+
+    # Marker binary file magic number.
+    MARKER_MAGIC_NUMBER = int( 3735929055 )
+
+    # Number of markers.
+    nMarker = len(marker)
+
+    # Open file for writing binary data using little endian.
+    with file.open('wb') as f:
+
+        # Write the marker magic number.
+        f.write( struct.pack( "<I", MARKER_MAGIC_NUMBER ) )
+
+        # Write the polynomial order and the number of markers.
+        f.write( struct.pack( "<2I", nPoly, nMarker ) )
+
+        # Loop over each marker and write its information.
+        for i in range(nMarker):
+
+            # Marker tag name. Ensure its size is not greater than the max value.
+            name = marker[i][0]
+            if len(name) > CGNS_STRING_SIZE:
+                sys.exit( "Marker name is larger than " + str(CGNS_STRING_SIZE) + " characters." )
+
+            # Extract marker indices.
+            ind = np.asarray( marker[i][1] ).ravel()
+
+            # Write its name tag and number of nodes.
+            f.write( struct.pack( "<{0}s".format(CGNS_STRING_SIZE), name.encode('utf-8') ) )
+            f.write( struct.pack( "<I", len(ind) ) )
+
+            # Write its indices, as a single array.
+            ind.astype('<i4').tofile(f)
+
+
+# Function that writes the coordinates of all elements of an AS3 grid, as little-endian floating points 
+# of the given type. These are written as a single block, or one row of elements at a time if they are streamed.
+def WriteCoordinatesAS3(f, vv, dtype='<f8'):
+    if isinstance(vv, CoordinatesAS3):
+        for row in vv.Rows():
+            np.ascontiguousarray( row, dtype=dtype ).tofile(f)
+    else:
+        np.ascontiguousarray( vv, dtype=dtype ).tofile(f)
+
+
+# Function that writes an AS3 grid in binary format. The byte order uses little-endian. The coordinates
+# are written in double (precision=8) or single (precision=4) precision. Double precision grids keep the
+# original header, whereas any other precision uses a separate magic number, followed by the precision.
+def WriteAS3GridBinaryFormat(grid_as3, file_p3d, precision=8):
 
     # Name of output directory for the AS3 grid.
     dirAS3 = "/grid_AS3/"
@@ -90,11 +177,8 @@ def WriteAS3GridBinaryFormat(grid_as3, file_p3d):
     # Absolute path to the AS3 grid folder.
     folder = cwd + dirAS3
 
-    # Extract name of grid file exclusively, without the directory.
-    bn = os.path.basename(file_p3d)
-   
-    # Remove the extension of the file.
-    fn = bn.split('.')[0]
+    # Name of the grid zone, without the directory and extension.
+    fn = ZoneName(file_p3d)
 
     # Add the complete file name, with extension and directory.
     fn = cwd + dirAS3 + fn + ".as3"
@@ -121,6 +205,9 @@ def WriteAS3GridBinaryFormat(grid_as3, file_p3d):
     # AS3 file magic number.
     AS3_MAGIC_NUMBER = int( 3735929054 )
 
+    # AS3 file magic number, in case the precision of the coordinates is specified in the header.
+    AS3_MAGIC_NUMBER_PRECISION = int( 3735929056 )
+
     # Dimension of the grid: 2D or 3D.
     dimgrid = int(2)
 
@@ -135,13 +222,21 @@ def WriteAS3GridBinaryFormat(grid_as3, file_p3d):
         sys.exit("Coordinates do not have the same polynomial order.")
     if nx*ny != xx.shape[0] or nx*ny != yy.shape[0]:
         sys.exit("Grid elements and coordinates are not of equal size.")
+    if precision != 4 and precision != 8:
+        sys.exit("Only single and double precision are supported.")
+
+    # Writing format of the coordinates.
+    dtype = '<f' + str(precision)
 
 
     # Open file for writing binary data using little endian (i.e. ">").
     with file.open('wb') as f:
        
-        # Write the AS3 magic number.
-        f.write( struct.pack( "<I", AS3_MAGIC_NUMBER ) )
+        # Write the AS3 magic number. Only if not in double precision, write the precision as well.
+        if precision == 8:
+            f.write( struct.pack( "<I", AS3_MAGIC_NUMBER ) )
+        else:
+            f.write( struct.pack( "<2I", AS3_MAGIC_NUMBER_PRECISION, precision ) )
 
         # Write the dimension of the grid: 2 for 2D, 3 for 3D.
         f.write( struct.pack( "<I", dimgrid ) )
@@ -153,12 +248,10 @@ def WriteAS3GridBinaryFormat(grid_as3, file_p3d):
         f.write( struct.pack( "<I", nNode2D ) );
 
         # Write the x-coordinates.
-        for i in range(len(xx)):
-            f.write( struct.pack( "<{0}d".format(nNode2D), *xx[i,:] ) )
+        WriteCoordinatesAS3( f, xx, dtype )
 
         # Write the y-coordinates.
-        for i in range(len(yy)):
-            f.write( struct.pack( "<{0}d".format(nNode2D), *yy[i,:] ) )
+        WriteCoordinatesAS3( f, yy, dtype )
 
         # Write the local element indicial face convention for the markers.
         f.write( struct.pack( "<4I", IMIN, IMAX, JMIN, JMAX ) )
@@ -183,9 +276,8 @@ def WriteAS3GridBinaryFormat(grid_as3, file_p3d):
             # Write the number of faces on this marker.
             f.write( struct.pack( "<I", nFace ) )
 
-            # Loop over its faces and write its information (iElem,iBoundary).
-            for j in range(nFace):
-                f.write( struct.pack( "<2I", mm[i][1][j][0], mm[i][1][j][1] ) )
+            # Write the information (iElem,iBoundary) of all its faces, as a single table.
+            np.ascontiguousarray( mm[i][1], dtype='<u4' ).reshape(nFace, 2).tofile(f)
 
 
 
@@ -1,20 +1,19 @@
 # Imported libraries/functions.
 import sys 
+import functools
 import numpy as np
 
 
 
 # Function that returns the indices on all surfaces, based on a clockwise convention.
+# The result is cached per grid size and is read-only, since it is shared by all the callers.
 def SurfaceIndicesClockwise(nx, ny):
+    return _SurfaceIndicesClockwise( int(nx), int(ny) )
 
-    # Total number of (unique) indices on the entire boundary.
-    ns = 2*nx + 2*ny - 4;
-
-    # Create the indices for all boundaries first.
-    boundary = np.zeros( ns, dtype=int )
 
-    # Counter for boundary indices.
-    s = 0
+# Function that constructs the indices on all surfaces, see SurfaceIndicesClockwise.
+@functools.lru_cache(maxsize=64)
+def _SurfaceIndicesClockwise(nx, ny):
 
     # The following is based on the convention of a Plot3D file.
     # The indices are using the clockwise convention. 
@@ -23,133 +22,228 @@ def SurfaceIndicesClockwise(nx, ny):
     # [nx]      : top-right corner.
     # [nx*ny]   : bottom-right corner.
     # [nx*ny-nx]: bottom-left corner.
-    
-    # JMAX surface.
-    for i in range(nx):
-        boundary[s] = i 
-        s += 1
-    
-    # IMAX boundary, exclude the first index since it is included in JMAX.
-    for j in range(1, ny-1):
-        boundary[s] = j*nx + nx - 1 
-        s += 1
-    
-    # JMIN surface, exclude the first indix since it is included in IMAX.
-    for i in range(1, nx):
-        boundary[s] = nx*ny - i 
-        s += 1
-    
-    # IMIN boundary, exclude the first and last indices since they are included in IMAX/IMIN.
-    for j in range(ny-1, 0, -1):
-        boundary[s] = j*nx 
-        s += 1
+    boundary = np.concatenate( (
+        # JMAX surface.
+        np.arange(nx, dtype=int),
+        # IMAX boundary, exclude the first index since it is included in JMAX.
+        np.arange(1, ny-1, dtype=int)*nx + nx - 1,
+        # JMIN surface, exclude the first indix since it is included in IMAX.
+        nx*ny - np.arange(1, nx, dtype=int),
+        # IMIN boundary, exclude the first and last indices since they are included in IMAX/IMIN.
+        np.arange(ny-1, 0, -1, dtype=int)*nx ) )
+
+    # The indices are shared between callers, so they must not be modified.
+    boundary.flags.writeable = False
 
     # Return the boundary indices.
     return boundary
 
 
+# Function that returns the position on the clockwise boundary of SurfaceIndicesClockwise, for the
+# grid indices in I. This is the inverse map of the boundary, deduced directly from (i,j) of every
+# index. Indices which are not on the boundary are assigned a position of -1.
+def SurfacePositionClockwise(I, nx, ny):
+
+    # Total number of (unique) indices on the entire boundary.
+    ns = 2*nx + 2*ny - 4
+
+    # Decompose the indices into their (i,j) pairs.
+    I = np.asarray(I, dtype=int)
+    i = I % nx; j = I // nx
+
+    # Default position, for indices that are not on the boundary.
+    pos = np.full( I.shape, -1, dtype=int )
+
+    # IMIN boundary, this includes both of its corners, of which the first wraps around to zero.
+    pos = np.where( i == 0,      (ns - j) % ns,          pos )
+    # JMIN surface.
+    pos = np.where( j == ny-1,   2*nx + ny - 3 - i,      pos )
+    # IMAX boundary.
+    pos = np.where( i == nx-1,   nx - 1 + j,             pos )
+    # JMAX surface.
+    pos = np.where( j == 0,      i,                      pos )
+    # Anything outside of the grid is not on the boundary.
+    pos = np.where( (I < 0) | (I >= nx*ny), -1,          pos )
+
+    # Return the position on the boundary.
+    return pos
+
+
 # Function that returns the indices for the line from I0 to I1, based on the clockwise direction.
 def FindIndicesLineClockwise(I0, I1, nx, ny, boundary):
 
-    # Make the boundary indices periodic, in case a marker has nodes 
-    # in the beginning and ending of the boundary array.
-    B = boundary
-    B = np.append(B, B)
+    # Number of surface points on the grid.
+    ns = len(boundary)
 
-    # Starting index.
-    iStartList = np.where( B == I0 )
-    iEndList   = np.where( B == I1 )
-    
-    # Take the first location of iStart and iEnd.
-    iStart = iStartList[0][0]
-    iEnd   = iEndList[0][0]
+    # Position of the starting and ending indices on the boundary.
+    iStart = int( SurfacePositionClockwise( np.ravel(I0)[0], nx, ny ) )
+    iEnd   = int( SurfacePositionClockwise( np.ravel(I1)[0], nx, ny ) )
+    if iStart < 0 or iEnd < 0:
+        sys.exit("Marker indices must be on the boundary.")
 
     # Take the periodicity of the indices into account, if needed.
     if iStart > iEnd:
-        iEnd = iEndList[0][1]
+        iEnd += ns
+
+    # Return the list of indices on this marker, as a single modular slice of the boundary.
+    return boundary[ np.arange(iStart, iEnd+1) % ns ]
+
+
+# Function that returns the runs of consecutive true entries of a periodic mask, as (first, last) pairs.
+def PeriodicRuns(mask):
+
+    # Number of entries.
+    n = len(mask)
+
+    # Special cases: nothing or everything is set.
+    if not np.any(mask): return np.zeros( (0,2), dtype=int )
+    if np.all(mask):     return np.array( [[0, n-1]], dtype=int )
+
+    # Start from an unset entry, such that no run wraps around.
+    r = int( np.argmin(mask) ) + 1
+    m = np.roll( mask, -r ).astype(np.int8)
+
+    # Detect where each run starts and stops.
+    d     = np.diff( np.concatenate( ([0], m, [0]) ) )
+    first = np.flatnonzero(d ==  1)
+    last  = np.flatnonzero(d == -1) - 1
+
+    # Return the runs, in the original positions.
+    return np.stack( ((first + r) % n, (last + r) % n), axis=1 )
 
-    # Determine the size of the indices on this marker.
-    ns = iEnd - iStart + 1
 
-    # Initialize the array of indices of this marker.
-    marker = np.zeros( ns, dtype=int )
+# Function that validates whether the markers cover the entire boundary exactly once, in the clockwise 
+# convention. This works on the positions along the boundary, so its memory is that of the boundary. 
+# Returns whether all is well, the missing and doubly covered boundary segments as (start, end) grid 
+# indices, and the names of the markers that are not contiguous in the clockwise direction.
+def ValidateMarkersBoundary(marker, nx, ny):
 
-    # Deduce the indicial values.
-    s = 0
-    for i in range(iStart, iEnd+1):
-        marker[s] = B[i]
-        s += 1
-     
-    # Return the list of indices on this marker.
-    return marker
+    # Extract the surface marker indices over entire grid.
+    S  = SurfaceIndicesClockwise(nx, ny)
+    ns = len(S)
+
+    # Collect the boundary segments, i.e. edges between two consecutive nodes, covered by the markers.
+    # An edge is identified by the position of its first node on the boundary.
+    edge = []; unordered = []
+    for i in range( len(marker) ):
+
+        # Positions of the current marker indices on the boundary.
+        pos = SurfacePositionClockwise( np.ravel(marker[i][1]), nx, ny )
+
+        # Check the marker is on the boundary and that its points are in the clockwise convention.
+        if len(pos) < 2 or np.any(pos < 0) or np.any( np.diff(pos) % ns != 1 ):
+            unordered.append( marker[i][0] )
+            continue
+
+        # Book-keep the edges of this marker.
+        edge.append( pos[:-1] )
+
+    # Number of times every edge is covered.
+    count = np.bincount( np.concatenate(edge) if edge else np.zeros(0, dtype=int), minlength=ns )
+
+    # Missing and doubly covered segments, from the start node of their first edge to the end node of their last edge.
+    missing = PeriodicRuns(count == 0)
+    doubled = PeriodicRuns(count >  1)
+    missing = np.stack( (S[missing[:,0]], S[(missing[:,1]+1) % ns]), axis=1 )
+    doubled = np.stack( (S[doubled[:,0]], S[(doubled[:,1]+1) % ns]), axis=1 )
+
+    # All is well, when every edge is covered exactly once by clockwise markers.
+    found = len(unordered) == 0 and len(missing) == 0 and len(doubled) == 0
+
+    # Return the outcome and its diagnostics.
+    return found, missing, doubled, unordered
 
 
 # Function that returns true/false on whether the entire boundary is included in markers.
+# If it is not, the diagnostics of ValidateMarkersBoundary are shown.
 def MarkersContainEntireBoundary(marker, nx, ny):
-    
-    # Default error flag.
-    found = True
 
-    # Number of markers.
-    nMarker = len(marker)
+    # Validate the markers on the boundary.
+    found, missing, doubled, unordered = ValidateMarkersBoundary(marker, nx, ny)
 
-    # Extract the surface marker indices over entire grid.
-    S0 = SurfaceIndicesClockwise(nx, ny)
-    
-    # Number of surface points on the grid.
-    ns = len(S0)
-
-    # Make the boundary indices periodic, similar to the trick above in FindIndicesLineClockwise.
-    S = np.append(S0, S0)
-
-    # Initialize an array of size boundary indices and with zero values.
-    v = np.zeros( nx*ny, dtype=int )
-
-    # Loop over all the marker indices and process data.
-    for i in range(nMarker):
- 
-        # For simplicity, abbreviate the current marker indices.
-        m = marker[i][1]       
-
-        # Find the index of the first marker point. Recall, the indices are clockwise.
-        I0 = np.where( S == m[0] )
-
-        # Consistency check.
-        if len(I0) != 1 or len(I0[0]) != 2: found = False
-
-        # Always take the first value, since periodicity is already accounted for.
-        I0 = I0[0][0]
-
-        # Extract the number of indices on this marker.
-        for j in range( len(m) ):
-            
-            # Increment this index by one, since it is on a marker.
-            v[m[j]] += 1 
-             
-            # Check that the points are in the clockwise convention.
-            if m[j] != S[I0+j]: found = False
-  
-    # Not the most efficient memory-wise, but it sure is simply for now.
-    v = v[S0]
-
-    # Ensure all boundary indices are tagged.
-    t = np.where( v == 0 )
-    if len(t)  != 1 or len(t[0])  != 0:          found = False
-    t = np.where( v == 1 )
-    if len(t)  != 1 or len(t[0])  != ns-nMarker: found = False
-    t = np.where( v == 2 )
-    if len(t)  != 1 or len(t[0])  != nMarker:    found = False
-    if v.min() != 1 or v.max() != 2:             found = False
-
-    # All went well.
+    # Show what went wrong, if anything.
+    for name in unordered:
+        print("Marker " + str(name) + " is not contiguous on the boundary in the clockwise direction.")
+    for I0, I1 in missing:
+        print("Boundary segment from index " + str(I0) + " to " + str(I1) + " is not included in any marker.")
+    for I0, I1 in doubled:
+        print("Boundary segment from index " + str(I0) + " to " + str(I1) + " is included in more than one marker.")
+
+    # Return whether all went well.
     return found
 
 
+# Class that is a spatial index of a set of points, based on a uniform grid hash. The points
+# are sorted by the cell they fall in, such that all points of a column of cells are contiguous.
+class UniformGridIndex:
+
+    # Constructor, based on the coordinates of the points.
+    def __init__(self, x, y):
+
+        # Coordinates of the points, in native double precision.
+        self.x = np.asarray(x, dtype=float).ravel()
+        self.y = np.asarray(y, dtype=float).ravel()
+
+        # Number of points.
+        n = len(self.x)
+        if n == 0 or n != len(self.y):
+            sys.exit("Spatial index requires a non-empty and consistent set of points.")
+
+        # Bounding box of the points.
+        self.x0 = self.x.min(); self.y0 = self.y.min()
+        w = self.x.max() - self.x0; h = self.y.max() - self.y0
+
+        # Size of a cell, such that there are about as many cells as points.
+        self.h = max( np.sqrt(w*h/n), max(w, h)/n, np.finfo(float).tiny )
+
+        # Number of cells per dimension.
+        self.nCx = int(w/self.h) + 1
+        self.nCy = int(h/self.h) + 1
+
+        # Cell of every point, where cells of the same column are consecutive.
+        key = self.CellX(self.x)*self.nCy + self.CellY(self.y)
+
+        # Sort the points by their cell.
+        self.order = np.argsort(key, kind='stable')
+        self.key   = key[self.order]
+
+    # Function that returns the column of cells of the given x-coordinates.
+    def CellX(self, x):
+        return np.clip( ((np.asarray(x) - self.x0)/self.h).astype(np.int64), 0, self.nCx-1 )
 
+    # Function that returns the row of cells of the given y-coordinates.
+    def CellY(self, y):
+        return np.clip( ((np.asarray(y) - self.y0)/self.h).astype(np.int64), 0, self.nCy-1 )
 
+    # Function that returns the indices of the points within a distance r of (xq,yq), closest first.
+    def QueryRadius(self, xq, yq, r):
 
+        # Range of cells that overlap with the search box.
+        cx0 = int( self.CellX(xq-r) ); cx1 = int( self.CellX(xq+r) )
+        cy0 = int( self.CellY(yq-r) ); cy1 = int( self.CellY(yq+r) )
 
+        # Gather the candidate points, one column of cells at a time.
+        base = np.arange(cx0, cx1+1, dtype=np.int64)*self.nCy
+        lo   = np.searchsorted( self.key, base + cy0, side='left'  )
+        hi   = np.searchsorted( self.key, base + cy1, side='right' )
+        cand = np.concatenate( [self.order[a:b] for a, b in zip(lo, hi)] )
 
+        # Keep the points within the distance, sorted by their distance.
+        d2   = (self.x[cand] - xq)**2 + (self.y[cand] - yq)**2
+        keep = np.flatnonzero(d2 <= r*r)
+        keep = keep[ np.argsort(d2[keep], kind='stable') ]
 
+        # Return the indices of the points.
+        return cand[keep]
 
+    # Function that returns the index of the point closest to (xq,yq).
+    def Nearest(self, xq, yq):
 
+        # Grow the search radius until a point is found. Since all points within the 
+        # radius are found, the closest of those is the closest of all points.
+        r = self.h
+        while True:
+            ind = self.QueryRadius(xq, yq, r)
+            if len(ind) > 0:
+                return int( ind[0] )
+            r *= 2
@@ -1,16 +1,27 @@
 # Imported libraries/functions.
 import sys
 import numpy as np
+import FileInput as fi
 import GeometryUtility as geo
 import ElementUtility as dgfem
 from matplotlib import pyplot as plt
 from matplotlib.widgets import Cursor
 from matplotlib.widgets import TextBox
+from matplotlib.lines import Line2D
+from matplotlib.collections import LineCollection
 
 
 
+# Maximum number of grid nodes shown inside the view at once, when using level-of-detail.
+NNODE_LOD = int(20000)
+
+
 # Function that enables visual interaction with data to tag boundary markers.
-def InteractiveMarker(data, nMarker, file, nPoly, iZone):
+# If blit is true and supported by the backend, the static part of the figure is cached
+# once and only the picked points and marker lines are redrawn on top of it.
+# If lod is true, the grid nodes are decimated based on the view, see ShowNodesLevelOfDetail.
+# Every click snaps to the nearest boundary node, which is found by means of a spatial index.
+def InteractiveMarker(data, nMarker, file, nPoly, iZone, blit=True, lod=True):
 
     # Extract the data variables, explicitly.
     x = data[iZone][0]
@@ -52,20 +63,73 @@ def InteractiveMarker(data, nMarker, file, nPoly, iZone):
     # Counter for the number of points selected.
     nPointPressed = 0   
 
+    # Artists drawn on top of the static figure: the picked points and the marker lines.
+    overlay = []
+
+    # Cached static figure, used when blitting.
+    background = None
+
+    # Function that adds an artist on top of the static figure.
+    def AddOverlay(xs, ys, **kwargs):
+        a = Line2D(xs, ys, **kwargs)
+        if blit:
+            # Keep it out of the axes, such that it never triggers a full redraw.
+            a.set_animated(True)
+            a.set_figure(fig)
+            a.set_transform(ax.transData)
+            a.set_clip_path(ax.patch)
+        else:
+            ax.add_line(a)
+        overlay.append(a)
+        return a
+
+    # Function that removes an artist from the top of the static figure.
+    def RemoveOverlay(a):
+        overlay.remove(a)
+        if not blit:
+            a.remove()
+
+    # Function that caches the static figure after every full redraw, e.g. due to a resize or zoom.
+    def ondraw(event):
+        nonlocal background
+        background = fig.canvas.copy_from_bbox(ax.bbox)
+        for a in overlay:
+            ax.draw_artist(a)
+
+    # Function that shows the latest state of the artists on top of the static figure.
+    def Refresh():
+        if not blit or background is None:
+            plt.draw()
+            return
+        fig.canvas.restore_region(background)
+        for a in overlay:
+            ax.draw_artist(a)
+        fig.canvas.blit(ax.bbox)
+        # The cursor blits as well, so it needs the updated figure underneath it.
+        cursor.clear(None)
+
+    # Spatial index of the boundary nodes, which are the only valid marker endpoints.
+    index = geo.UniformGridIndex( x[surf], y[surf] )
+
     # The actual implementation.
-    def onpick(event):
+    def onclick(event):
         nonlocal I0, nPointPressed
-    
-        # Get the index of the points chosen.
-        ind = event.ind
-    
-        # Points selected must be one.
-        if len(ind) != 1:
+
+        # Only consider left clicks inside the axes, while not zooming or panning.
+        if event.inaxes is not ax or event.button != 1 or event.xdata is None:
+            return
+        if fig.canvas.widgetlock.locked():
             return
+        if fig.canvas.toolbar is not None and fig.canvas.toolbar.mode:
+            return
+    
+        # Snap the click to the nearest boundary node, which are the only valid marker endpoints.
+        ind = surf[ [ index.Nearest(event.xdata, event.ydata) ] ]
        
         # Show selected point.
-        ax.plot(x[ind], y[ind], 'o', markerfacecolor='none', color='red', linewidth=2, markersize=10)
-        plt.draw() 
+        AddOverlay(x[ind], y[ind], marker='o', linestyle='none', markerfacecolor='none', 
+                   color='red', linewidth=2, markersize=10)
+        Refresh()
     
         # Increment the number of points pressed.
         nPointPressed += 1
@@ -77,7 +141,8 @@ def InteractiveMarker(data, nMarker, file, nPoly, iZone):
             ij = geo.FindIndicesLineClockwise(I0, ind, nx, ny, surf)
     
             # Plot the connecting line between the two indices.
-            ax.plot(x[ij], y[ij], color='green', linewidth=3)
+            line = AddOverlay(x[ij], y[ij], color='green', linewidth=3)
+            Refresh()
             
             # Ask the user for an explicit marker tag name.
             name = []
@@ -95,13 +160,13 @@ def InteractiveMarker(data, nMarker, file, nPoly, iZone):
             # Book-keep marker information.
             marker.append( [name, ij] )
 
-            # Extract the plots from the figure and remove the starting and ending points.
-            pts = ax.get_lines()
-            pts[-3].remove() # start point
-            pts[-2].remove() # end   point
+            # Remove the starting and ending points.
+            RemoveOverlay( overlay[-3] ) # start point
+            RemoveOverlay( overlay[-2] ) # end   point
     
             # Change the color of the most recent connecting line.
-            pts[-1].set_color("gray")
+            line.set_color("gray")
+            Refresh()
             
         else:
             # Save the starting index.
@@ -116,12 +181,21 @@ def InteractiveMarker(data, nMarker, file, nPoly, iZone):
 
     # Initialize a single plot to rule them all.
     fig, ax = plt.subplots()
+
+    # Only blit when the backend supports it.
+    blit = blit and fig.canvas.supports_blit
     
     # Display the boundary of the remaining zones in the background.
     ShowBackgroundGridZone(data, iZone)
 
-    # Plot the input grid zone data.
-    ax.plot(x, y, '^', picker=True)
+    # Plot the input grid zone data, decimated if requested.
+    if lod:
+        nodes = ShowNodesLevelOfDetail(ax, x, y, nx, ny)
+    else:
+        nodes, = ax.plot(x, y, '^')
+
+    # Plot the boundary nodes on top, which are the only ones that can be selected.
+    ax.plot(x[surf], y[surf], '^', color=nodes.get_color())
    
     # Show the elements, for convenience.
     ShowElementsGrid(x,y,nx,ny,nPoly)
@@ -129,8 +203,12 @@ def InteractiveMarker(data, nMarker, file, nPoly, iZone):
     # Title of figure.
     ax.set_title( "Marker tag selector for grid file: " + str(file) )
     
-    # Pick event, for user interaction with data.
-    fig.canvas.mpl_connect("pick_event", onpick)
+    # Cache the static figure, before the cursor caches its own background.
+    if blit:
+        fig.canvas.mpl_connect("draw_event", ondraw)
+
+    # Click event, for user interaction with data.
+    fig.canvas.mpl_connect("button_press_event", onclick)
 
     # Make the figure full screen, for convenience.
     figManager = plt.get_current_fig_manager()
@@ -158,6 +236,46 @@ def InteractiveMarker(data, nMarker, file, nPoly, iZone):
     return marker
 
 
+# Function that shows the grid nodes with a level-of-detail, based on the current view. The grid is
+# decimated by strides of powers of two, of which the finest that has at most nMax nodes inside 
+# the view is shown. This is updated whenever the view changes, e.g. when zooming in.
+def ShowNodesLevelOfDetail(ax, x, y, nx, ny, nMax=NNODE_LOD):
+
+    # Grid coordinates, indexed by (j,i).
+    X = np.reshape(x, (ny, nx))
+    Y = np.reshape(y, (ny, nx))
+
+    # Coarsest stride, such that the entire grid has at most nMax nodes.
+    s = 1
+    while (nx//s + 1)*(ny//s + 1) > nMax: s *= 2
+
+    # Available strides, from coarse to fine.
+    strides = [ 2**k for k in range( int(np.log2(s)), -1, -1 ) ]
+
+    # Show the coarsest level initially.
+    nodes, = ax.plot( X[::s, ::s].ravel(), Y[::s, ::s].ravel(), '^' )
+
+    # Function that selects the finest level within the view.
+    def Update(axes):
+        x0, x1 = sorted( ax.get_xlim() )
+        y0, y1 = sorted( ax.get_ylim() )
+        xs = None
+        for k in strides:
+            xk = X[::k, ::k]; yk = Y[::k, ::k]
+            inside = (xk >= x0) & (xk <= x1) & (yk >= y0) & (yk <= y1)
+            if xs is not None and np.count_nonzero(inside) > nMax:
+                break
+            xs = xk[inside]; ys = yk[inside]
+        nodes.set_data(xs, ys)
+
+    # Update the nodes whenever the view changes.
+    ax.callbacks.connect('xlim_changed', Update)
+    ax.callbacks.connect('ylim_changed', Update)
+
+    # Return the artist of the nodes.
+    return nodes
+
+
 # Function that shows the elements separately, on the figure.
 def ShowElementsGrid(x,y,nx,ny,nPoly):
 
@@ -165,41 +283,34 @@ def ShowElementsGrid(x,y,nx,ny,nPoly):
     nxElem = dgfem.DetermineNumberOfElements(nx, nPoly) 
     nyElem = dgfem.DetermineNumberOfElements(ny, nPoly)  
 
-    # Deduce the number of nodes, based on nPoly=1 elements.
-    nxP1 = nxElem + 1
-    nyP1 = nyElem + 1
-
-    # Initialize coordinates of the P1 nodes.
-    xP1 = np.zeros( (nxP1,nyP1), dtype=float )
-    yP1 = np.zeros( (nxP1,nyP1), dtype=float )
-
-    # Extract the coordinates of the P1 nodes.
-    for j in range(nyP1):
-        ij = j*nPoly*nx 
-        for i in range(nxP1):
-            xP1[i,j] = x[ij]
-            yP1[i,j] = y[ij] 
-            ij += nPoly
-    
-    # Plot the elements.
-    for i in range(nxP1):
-        plt.plot(xP1[i,:], yP1[i,:], 'k:')
-    for j in range(nyP1):
-        plt.plot(xP1[:,j], yP1[:,j], 'k:')
+    # Extract the coordinates of the P1 nodes, as strided views of the grid, indexed by (j,i).
+    xP1 = np.reshape(x, (ny, nx))[::nPoly, ::nPoly]
+    yP1 = np.reshape(y, (ny, nx))[::nPoly, ::nPoly]
+
+    # Ensure the P1 nodes are consistent with the number of elements.
+    if xP1.shape != (nyElem+1, nxElem+1):
+        sys.exit("Could not extract the P1 nodes of the elements.")
+
+    # Coordinates of the P1 nodes, as (x,y) pairs.
+    P1 = np.stack( (xP1, yP1), axis=-1 )
 
+    # Plot the elements, by means of a single collection of all the grid lines.
+    lines = list( P1 ) + list( P1.transpose(1,0,2) )
+    plt.gca().add_collection( LineCollection( lines, colors='k', linestyles=':' ) )
 
-# Function that extracts remaining zones and plots their boundary in the background.
+
+# Function that extracts remaining zones and plots their boundary in the background. All the boundaries
+# are merged into a single collection, such that they are drawn at once.
 def ShowBackgroundGridZone(data, iZone):
 
     # Number of zones.
     nZone = len(data)
 
-    # Loop over the zones and plot the surfaces of the remaining grids.
+    # Loop over the zones and gather the surfaces of the remaining grids.
+    outline = []
     for i in range(nZone):
         if i != iZone:
             # Number of points in x and y of this zone.
-            x = data[i][0]
-            y = data[i][1]
             n = data[i][3]
 
             # Extract the number of points per dimension. Ensure the z-dimension is trivial.
@@ -207,12 +318,19 @@ def ShowBackgroundGridZone(data, iZone):
             if nz != 1:
                 sys.exit("Grid must be two-dimensional, only a single point in the z-coordinates is expected.")
 
-            # Extract the surface indices of this zone.
-            s = geo.SurfaceIndicesClockwise(nx, ny)
+            # Extract the boundary coordinates of this zone. Lazy zones only read their boundary.
+            if isinstance(data[i], fi.BlockPlot3D):
+                xs, ys = data[i].LoadBoundary()
+            else:
+                s = geo.SurfaceIndicesClockwise(nx, ny)
+                xs = data[i][0][s]; ys = data[i][1][s]
  
-            # Show the boundary of the zones.
-            plt.plot( x[s],y[s], color='gray', linewidth=1 )
-
-
+            # Book-keep the boundary of this zone.
+            outline.append( np.stack( (xs, ys), axis=1 ) )
 
+    # Nothing to show, if there are no remaining zones.
+    if len(outline) == 0:
+        return
 
+    # Show the boundary of the zones, as a single collection.
+    plt.gca().add_collection( LineCollection( outline, colors='gray', linewidths=1 ) )
@@ -39,6 +39,36 @@ void SwapBytes
 
 
 
+void ReadCoordinates
+(
+ FILE                *fh,
+ unsigned int         precision,
+ std::vector<double> &coor
+)
+ /*
+	* Function, which reads the coordinates of a single element,
+	* stored in either single or double precision.
+	*/
+{
+	// Number of nodes in this element.
+	const size_t nNode = coor.size();
+
+	// Double precision can be read directly.
+	if( precision == sizeof(double) )
+	{
+		if( std::fread( coor.data(), sizeof(double), nNode, fh ) != nNode ) exit(1);
+		return;
+	}
+
+	// Single precision is read into a buffer first, then converted.
+	std::vector<float> buf(nNode);
+	if( std::fread( buf.data(), sizeof(float), nNode, fh ) != nNode ) exit(1);
+	for(size_t i=0; i<nNode; i++)
+		coor[i] = static_cast<double>( buf[i] );
+}
+
+
+
 int main(int argc, char **argv)
 {
 	if (argc != 2)
@@ -55,6 +85,9 @@ int main(int argc, char **argv)
 	// AS3 magic number.
 	const unsigned int AS3_MAGIC_NUMBER = 3735929054; 
 
+	// AS3 magic number, in case the precision is specified in the header.
+	const unsigned int AS3_MAGIC_NUMBER_PRECISION = 3735929056;
+
 
 	// Common variables, used later for writing.
 	unsigned int c_nElem;
@@ -84,7 +117,16 @@ int main(int argc, char **argv)
 	// Read integer.
 	if( std::fread( &someunsignedinteger, sizeof(unsigned int), 1, fh ) != 1 ) exit(1);
 	std::cout << "magic number: " << someunsignedinteger << std::endl;
-	if (someunsignedinteger != AS3_MAGIC_NUMBER) { exit(1); }
+
+	// Precision of the coordinates, which is double unless specified otherwise.
+	unsigned int precision = sizeof(double);
+	if (someunsignedinteger == AS3_MAGIC_NUMBER_PRECISION)
+	{
+		std::fread( &precision, sizeof(unsigned int), 1, fh );
+		if (precision != sizeof(float) && precision != sizeof(double)) { exit(1); }
+	}
+	else if (someunsignedinteger != AS3_MAGIC_NUMBER) { exit(1); }
+	std::cout << "precision: " << precision << std::endl;
 
 	std::fread( &someinteger, sizeof(int), 1, fh );
 	std::cout << "ndim: " << someinteger << std::endl;
@@ -104,7 +146,7 @@ int main(int argc, char **argv)
 	c_nElem = n;
 	std::vector<std::vector<double>> xx( n, std::vector<double>(nNode) );
 	for(size_t i=0; i<n; i++)
-		std::fread( xx[i].data(), sizeof(double), nNode, fh );
+		ReadCoordinates( fh, precision, xx[i] );
 	
 	c_xx = xx;
 	std::cout << "x-coordinate: " << std::endl;
@@ -117,7 +159,7 @@ int main(int argc, char **argv)
 
 	std::vector<std::vector<double>> yy( n, std::vector<double>(nNode) );
 	for(size_t i=0; i<n; i++)
-		std::fread( yy[i].data(), sizeof(double), nNode, fh );
+		ReadCoordinates( fh, precision, yy[i] );
 
 	c_yy = yy;
 	std::cout << "y-coordinate: " << std::endl;